@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import concurrent.futures
+import contextlib
+import copy
 import functools
 import itertools
 import os
+import pickle
+import threading
 import warnings
 from collections import namedtuple
 from hashlib import md5
@@ -20,16 +25,179 @@ from typing import (
 
 import _pytest.cacheprovider
 import botocore
+import botocore.credentials
 import botocore.exceptions
+import botocore.loaders
 import botocore.session
 
 SERVICES_WITHOUT_REGIONS = ["iam", "s3", "route53"]
 
+DEFAULT_MAX_WORKERS = 8
+
+# botocore sessions are not thread-safe, so serialize session and client
+# creation. The created clients are thread-safe.
+_session_lock = threading.RLock()
+
+
+class ModelCachingLoader(botocore.loaders.Loader):
+    """Data loader shared by all botocore sessions so each service model
+    is read and parsed once per process.
+
+    When cache_dir is set, parsed service models are also pickled there
+    (per botocore version) and loaded from the pickles in later runs,
+    which is faster than parsing the JSON models again.
+    """
+
+    def __init__(self: "ModelCachingLoader", cache_dir: Optional[str] = None):
+        data_path = os.environ.get("AWS_DATA_PATH")
+        super().__init__(
+            extra_search_paths=data_path.split(os.pathsep) if data_path else None
+        )
+        self.cache_dir = cache_dir
+
+    @botocore.loaders.instance_cache
+    def load_service_model(
+        self: "ModelCachingLoader",
+        service_name: str,
+        type_name: str,
+        api_version: Optional[str] = None,
+    ) -> Any:
+        if self.cache_dir is None:
+            return super().load_service_model(service_name, type_name, api_version)
+
+        path = os.path.join(
+            self.cache_dir,
+            botocore.__version__,
+            "{}-{}-{}.pickle".format(service_name, type_name, api_version or "latest"),
+        )
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (IOError, OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        model = super().load_service_model(service_name, type_name, api_version)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError):
+            warnings.warn("could not write botocore model cache {}".format(path))
+        return model
+
+
+@functools.lru_cache(maxsize=1)
+def get_data_loader(cache_dir: Optional[str] = None) -> ModelCachingLoader:
+    """Returns the botocore data loader shared by all sessions."""
+    return ModelCachingLoader(cache_dir)
+
+
+# set by configure_model_cache before sessions are created
+_model_cache_dir: Optional[str] = None
+
+
+def configure_model_cache(cache_dir: Optional[str]) -> None:
+    """Sets the directory to persist parsed botocore service models in.
+
+    Must be called before the first session is created.
+    """
+    global _model_cache_dir
+    _model_cache_dir = cache_dir
+
+
+class AssumedRole(NamedTuple):
+    role_arn: str
+    source_profile: Optional[str] = None
+
+
+# profile names registered by assumed_role_profile
+_assumed_roles: Dict[str, AssumedRole] = {}
+
+
+def assumed_role_profile(
+    account_id: str, role_name: str, source_profile: Optional[str] = None
+) -> str:
+    """Registers and returns a profile name for an account reached by
+    assuming role_name in it with the source_profile's credentials.
+
+    The profile name is the account id, so results are tagged by account:
+
+    >>> assumed_role_profile("123456789012", "FrostAudit")
+    '123456789012'
+    >>> _assumed_roles["123456789012"]
+    AssumedRole(role_arn='arn:aws:iam::123456789012:role/FrostAudit', source_profile=None)
+    """
+    _assumed_roles[account_id] = AssumedRole(
+        role_arn="arn:aws:iam::{}:role/{}".format(account_id, role_name),
+        source_profile=source_profile,
+    )
+    return account_id
+
+
+@functools.lru_cache()
+def get_assumed_role_credentials(
+    profile: str,
+) -> botocore.credentials.RefreshableCredentials:
+    """Returns credentials for a profile registered by assumed_role_profile
+    from assuming its role with STS, refreshed before they expire.
+
+    Can raise botocore.exceptions.ClientError e.g. when the role does not
+    exist or the source profile is not allowed to assume it.
+    """
+    assumed_role = _assumed_roles[profile]
+
+    def assume_role() -> Dict[str, str]:
+        sts = get_client(assumed_role.source_profile, "us-east-1", "sts")
+        credentials = sts.assume_role(
+            RoleArn=assumed_role.role_arn, RoleSessionName="frost"
+        )["Credentials"]
+        return dict(
+            access_key=credentials["AccessKeyId"],
+            secret_key=credentials["SecretAccessKey"],
+            token=credentials["SessionToken"],
+            expiry_time=credentials["Expiration"].isoformat(),
+        )
+
+    return botocore.credentials.RefreshableCredentials.create_from_metadata(
+        metadata=assume_role(),
+        refresh_using=assume_role,
+        method=AssumeRoleCredentialProvider.METHOD,
+    )
+
+
+class AssumeRoleCredentialProvider(botocore.credentials.CredentialProvider):
+    """Provides credentials already fetched by get_assumed_role_credentials,
+    so creating a session or client makes no STS calls."""
+
+    METHOD = "frost-assume-role"
+
+    def __init__(
+        self: "AssumeRoleCredentialProvider",
+        credentials: botocore.credentials.RefreshableCredentials,
+    ):
+        self.credentials = credentials
+
+    def load(
+        self: "AssumeRoleCredentialProvider",
+    ) -> botocore.credentials.RefreshableCredentials:
+        return self.credentials
+
 
 @functools.lru_cache()
 def get_session(profile: Optional[str] = None) -> botocore.session.Session:
     """Returns a new or cached botocore session for the AWS profile."""
 
+    if profile in _assumed_roles:
+        # assume the role before taking the lock
+        credentials = get_assumed_role_credentials(profile)
+        with _session_lock:
+            session = botocore.session.Session()
+            session.register_component("data_loader", get_data_loader(_model_cache_dir))
+            session.get_component("credential_provider").insert_before(
+                "env", AssumeRoleCredentialProvider(credentials)
+            )
+            return session
+
     # If AWS_PROFILE is set and does not match what we want, unset this variable before
     # we proceed.
     if "AWS_PROFILE" in os.environ and os.environ["AWS_PROFILE"] != profile:
@@ -41,7 +209,10 @@ def get_session(profile: Optional[str] = None) -> botocore.session.Session:
         del os.environ["AWS_PROFILE"]
 
     # can raise botocore.exceptions.ProfileNotFound
-    return botocore.session.Session(profile=profile)
+    with _session_lock:
+        session = botocore.session.Session(profile=profile)
+        session.register_component("data_loader", get_data_loader(_model_cache_dir))
+        return session
 
 
 @functools.lru_cache()
@@ -51,15 +222,21 @@ def get_client(profile: str, region: str, service: str) -> botocore.client.BaseC
     Warns when a service is not available for a region, which means we
     need to update botocore or skip that call for that region.
     """
-    session = get_session(profile)
+    if profile in _assumed_roles:
+        # assume the role before taking the lock so get_session finds the
+        # credentials cached and makes no STS call while holding it
+        get_assumed_role_credentials(profile)
 
-    if (
-        region not in session.get_available_regions(service)
-        and service not in SERVICES_WITHOUT_REGIONS
-    ):
-        warnings.warn("service {} not available in {}".format(service, region))
+    with _session_lock:
+        session = get_session(profile)
 
-    return session.create_client(service, region_name=region)
+        if (
+            region not in session.get_available_regions(service)
+            and service not in SERVICES_WITHOUT_REGIONS
+        ):
+            warnings.warn("service {} not available in {}".format(service, region))
+
+        return session.create_client(service, region_name=region)
 
 
 @functools.lru_cache(maxsize=1)
@@ -80,6 +257,16 @@ def get_available_services(profile: Optional[str] = None) -> Iterable[str]:
     return services
 
 
+def get_organization_account_ids(profile: Optional[str] = None) -> List[str]:
+    """Returns the ids of active accounts in the profile's AWS organization."""
+    organizations = get_client(profile, "us-east-1", "organizations")
+    return [
+        account["Id"]
+        for account in full_results(organizations, "list_accounts", [], {})["Accounts"]
+        if account["Status"] == "ACTIVE"
+    ]
+
+
 @functools.lru_cache()
 def get_account_id(profile: str) -> str:
     sts = get_client(profile, "us-east-1", "sts")
@@ -88,24 +275,64 @@ def get_account_id(profile: str) -> str:
     return account_id
 
 
+def get_profile_account_id(profile: Optional[str]) -> str:
+    """Returns the account id of a profile. Profiles registered by
+    assumed_role_profile are named by their account id, so need no STS call.
+
+    >>> get_profile_account_id(assumed_role_profile("123456789012", "FrostAudit"))
+    '123456789012'
+    """
+    if profile in _assumed_roles:
+        return profile
+    return get_account_id(profile)
+
+
 def full_results(
     client: botocore.client.BaseClient,
     method: str,
     args: List[str],
     kwargs: Dict[str, Any],
+    page_filter: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
-    """Returns JSON results for an AWS botocore call. Flattens paginated results (if any)."""
+    """Returns JSON results for an AWS botocore call. Flattens paginated results (if any).
+
+    When page_filter is set it is applied to each page as it arrives and
+    only its output is kept, so large listings are never fully in memory.
+    """
     if client.can_paginate(method):
         paginator = client.get_paginator(method)
-        full_result: Dict[str, Any] = paginator.paginate(
-            *args, **kwargs
-        ).build_full_result()
+        pages = paginator.paginate(*args, **kwargs)
+        if page_filter is not None:
+            return merge_pages(page_filter(page) for page in pages)
+
+        full_result: Dict[str, Any] = pages.build_full_result()
         return full_result
     else:
         single_result: Dict[str, Any] = getattr(client, method)(*args, **kwargs)
+        if page_filter is not None:
+            return page_filter(single_result)
         return single_result
 
 
+def merge_pages(pages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merges result pages concatenating list values and keeping the
+    last value for other keys.
+
+    >>> merge_pages([{'Records': [1, 2], 'IsTruncated': True}, {'Records': [3], 'IsTruncated': False}])
+    {'Records': [1, 2, 3], 'IsTruncated': False}
+    >>> merge_pages([])
+    {}
+    """
+    merged: Dict[str, Any] = {}
+    for page in pages:
+        for key, value in page.items():
+            if isinstance(value, list) and isinstance(merged.get(key), list):
+                merged[key].extend(value)
+            else:
+                merged[key] = value
+    return merged
+
+
 class AWSAPICall(NamedTuple):
     profile: Optional[str] = None
     region: Optional[str] = None
@@ -113,6 +340,7 @@ class AWSAPICall(NamedTuple):
     method: Optional[str] = None
     args: List[str] = []
     kwargs: Dict[str, Any] = {}
+    page_filter: Optional[str] = None
 
 
 default_call = AWSAPICall()
@@ -129,6 +357,18 @@ def cache_key(call: AWSAPICall) -> str:
     ... args=['arg1', 'arg2'],
     ... kwargs=dict(kwarg1=True)))
     'pytest_aws/profile/region/service_name/method_name/9965c005f623cd9130dd5a6dbdee87de.json'
+
+    Filtered results are cached separately from unfiltered results:
+
+    >>> cache_key(default_call._replace(
+    ... profile='profile',
+    ... region='region',
+    ... service='service_name',
+    ... method='method_name',
+    ... args=['arg1', 'arg2'],
+    ... kwargs=dict(kwarg1=True),
+    ... page_filter='module.filter_func'))
+    'pytest_aws/profile/region/service_name/method_name/ec1b84697e6aa472ef16405d3cfab096.json'
     """
     path = "/".join(
         [
@@ -146,12 +386,28 @@ def cache_key(call: AWSAPICall) -> str:
             ",".join("{}={}".format(k, v) for (k, v) in call.kwargs.items()),
         ]
     )
+    if call.page_filter is not None:
+        arguments += ":" + call.page_filter
 
     filename = md5(str.encode(arguments)).hexdigest() + ".json"
 
     return f"{path}/{filename}"
 
 
+def page_filter_name(
+    page_filter: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]
+) -> Optional[str]:
+    """Returns a stable name for a page filter function to use in cache keys.
+
+    >>> page_filter_name(None)
+    >>> page_filter_name(merge_pages)
+    'aws.client.merge_pages'
+    """
+    if page_filter is None:
+        return None
+    return "{}.{}".format(page_filter.__module__, page_filter.__qualname__)
+
+
 def get_aws_resource(
     service_name: str,
     method_name: str,
@@ -163,55 +419,97 @@ def get_aws_resource(
     result_from_error: Optional[Callable[[Any, Any], Any]] = None,
     debug_calls: bool = False,
     debug_cache: bool = False,
+    page_filter: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    max_workers: int = 1,
+    request_slots: Optional[threading.Semaphore] = None,
 ) -> Generator[Dict[str, Any], None, None]:
     """
     Fetches and yields AWS API JSON responses for all profiles and regions (list params)
+
+    Profiles and regions are fetched with up to max_workers threads and
+    results are yielded in profile and region order. request_slots, when
+    given, limits API requests in flight across all callers sharing it.
     """
     assert isinstance(profiles, list)
     assert isinstance(regions, list)
-    for profile, region in itertools.product(profiles, regions):
-        call = default_call._replace(
+    calls = [
+        default_call._replace(
             profile=profile,
             region=region,
             service=service_name,
             method=method_name,
             args=call_args,
             kwargs=call_kwargs,
+            page_filter=page_filter_name(page_filter),
         )
+        for profile, region in itertools.product(profiles, regions)
+    ]
+    fetch = functools.partial(
+        fetch_aws_resource,
+        cache=cache,
+        result_from_error=result_from_error,
+        debug_calls=debug_calls,
+        debug_cache=debug_cache,
+        page_filter=page_filter,
+        request_slots=request_slots,
+    )
 
-        if debug_calls:
-            print("calling", call)
-
-        result = None
-        if cache is not None:
-            ckey = cache_key(call)
-            result = cache.get(ckey, None)
+    if max_workers <= 1 or len(calls) <= 1:
+        for call in calls:
+            yield fetch(call)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(fetch, calls)
 
-            if debug_cache and result is not None:
-                print("found cached value for", ckey)
 
-        if result is None:
-            client = get_client(call.profile, call.region, call.service)
-            assert isinstance(call.method, str)
-            try:
-                result = full_results(client, call.method, call.args, call.kwargs)
-                result["__pytest_meta"] = dict(profile=call.profile, region=call.region)
-            except botocore.exceptions.ClientError as error:
-                if result_from_error is None:
-                    raise error
-                else:
-                    if debug_calls:
-                        print("error fetching resource", error, call)
+def fetch_aws_resource(
+    call: AWSAPICall,
+    cache: Optional[_pytest.cacheprovider.Cache],
+    result_from_error: Optional[Callable[[Any, Any], Any]] = None,
+    debug_calls: bool = False,
+    debug_cache: bool = False,
+    page_filter: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    request_slots: Optional[threading.Semaphore] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the cached or fetched AWS API JSON response for one profile and region
+    """
+    if debug_calls:
+        print("calling", call)
+
+    result = None
+    if cache is not None:
+        ckey = cache_key(call)
+        result = cache.get(ckey, None)
+
+        if debug_cache and result is not None:
+            print("found cached value for", ckey)
+
+    if result is None:
+        client = get_client(call.profile, call.region, call.service)
+        assert isinstance(call.method, str)
+        try:
+            with request_slots or contextlib.nullcontext():
+                result = full_results(
+                    client, call.method, call.args, call.kwargs, page_filter
+                )
+            result["__pytest_meta"] = dict(profile=call.profile, region=call.region)
+        except botocore.exceptions.ClientError as error:
+            if result_from_error is None:
+                raise error
+            else:
+                if debug_calls:
+                    print("error fetching resource", error, call)
 
-                    result = result_from_error(error, call)
+                result = result_from_error(error, call)
 
-            if cache is not None:
-                if debug_cache:
-                    print("setting cache value for", ckey)
+        if cache is not None:
+            if debug_cache:
+                print("setting cache value for", ckey)
 
-                cache.set(ckey, result)
+            cache.set(ckey, result)
 
-        yield result
+    return result
 
 
 class BotocoreClient:
@@ -223,6 +521,8 @@ class BotocoreClient:
         debug_calls: bool,
         debug_cache: bool,
         offline: bool,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        config_aggregator: Optional[Any] = None,
     ):
         self.profiles = profiles or [None]
         self.cache = cache
@@ -230,6 +530,11 @@ class BotocoreClient:
         self.debug_calls = debug_calls
         self.debug_cache = debug_cache
         self.offline = offline
+        self.max_workers = max_workers
+        # shared by copies returned from get to cap API requests in flight
+        self.request_slots = threading.BoundedSemaphore(max_workers)
+        # an optional aws.config_aggregator.ConfigAggregatorBackend
+        self.config_aggregator = config_aggregator
 
         if offline:
             self.regions = ["us-east-1"]
@@ -255,7 +560,30 @@ class BotocoreClient:
         regions: Optional[List[str]] = None,
         result_from_error: Optional[Callable[[Any, Any], Any]] = None,
         do_not_cache: bool = False,
+        page_filter: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
     ) -> "BotocoreClient":
+        """Fetches results for the call and returns a new client wrapping them.
+
+        page_filter, a named function, is applied to each response page
+        and only its output is kept and cached (see full_results).
+
+        When a config aggregator backend is set and handles the call, and
+        no profiles or regions are given, results come from the aggregator.
+
+        Returning a copy leaves this client untouched, so calls can be
+        made from multiple threads (see map).
+
+        >>> c = BotocoreClient([None], None, None, None, None, offline=True)
+        >>> c.get("ec2", "describe_instances", [], {}) is c
+        False
+        """
+
+        use_config_aggregator = (
+            self.config_aggregator is not None
+            and profiles is None
+            and regions is None
+            and self.config_aggregator.handles(service_name, method_name, call_kwargs)
+        )
 
         # TODO:
         # For services that don't have the concept of regions,
@@ -265,10 +593,20 @@ class BotocoreClient:
         if service_name in SERVICES_WITHOUT_REGIONS:
             regions = ["us-east-1"]
 
+        client = copy.copy(self)
         if self.offline:
-            self.results = []
+            client.results = []
+        elif use_config_aggregator:
+            client.results = self.config_aggregator.get(
+                service_name,
+                method_name,
+                self.regions,
+                cache=self.cache if not do_not_cache else None,
+                debug_calls=self.debug_calls,
+                debug_cache=self.debug_cache,
+            )
         else:
-            self.results = list(
+            client.results = list(
                 get_aws_resource(
                     service_name,
                     method_name,
@@ -280,10 +618,35 @@ class BotocoreClient:
                     result_from_error=result_from_error,
                     debug_calls=self.debug_calls,
                     debug_cache=self.debug_cache,
+                    page_filter=page_filter,
+                    max_workers=self.max_workers,
+                    request_slots=self.request_slots,
                 )
             )
 
-        return self
+        return client
+
+    def map(
+        self: "BotocoreClient", func: Callable[[Any], Any], items: Iterable[Any]
+    ) -> List[Any]:
+        """Calls func on each item with up to max_workers threads and
+        returns the results in the same order as items:
+
+        >>> c = BotocoreClient([None], None, None, None, None, offline=True)
+        >>> c.map(lambda x: x * 2, [1, 2, 3])
+        [2, 4, 6]
+        >>> c.max_workers = 1
+        >>> c.map(str, range(3))
+        ['0', '1', '2']
+        """
+        items = list(items)
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            return list(executor.map(func, items))
 
     def values(self: "BotocoreClient") -> Iterable[Any]:
         """Returns the wrapped value
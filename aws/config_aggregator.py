@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Optional AWS Config aggregator backend for BotocoreClient
+
+Answers inventory calls with paginated select_aggregate_resource_config
+queries against a configuration aggregator instead of calling describe_*
+for every account and region. Results are mapped to the shapes the
+describe_* calls return, so resource functions work unchanged.
+"""
+
+import json
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import _pytest.cacheprovider
+
+from aws.client import (
+    SERVICES_WITHOUT_REGIONS,
+    get_aws_resource,
+    get_profile_account_id,
+)
+from cache import json_iso_datetime_string_to_datetime
+
+
+class AggregatorQuery(NamedTuple):
+    # AWS Config resource type to select
+    resource_type: str
+    # call_kwargs of the describe call the query answers
+    call_kwargs: Dict[str, Any]
+    # wraps a list of resources in the describe call response shape
+    wrap: Callable[[List[Dict[str, Any]]], Dict[str, Any]]
+    # returns False for resources the describe call would not return
+    keep: Callable[[Dict[str, Any]], bool] = lambda resource: True
+    # fixes up keys that differ between configuration items and describe results
+    fix: Callable[[Dict[str, Any]], Dict[str, Any]] = lambda resource: resource
+
+
+def fix_security_group(security_group: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Configuration items list IPv4 ranges as strings under ipRanges and as
+    dicts under ipv4Ranges, while describe_security_groups uses dicts
+    under IpRanges.
+
+    >>> fix_security_group({'IpPermissions': [{'IpRanges': ['0.0.0.0/0'], 'Ipv4Ranges': [{'CidrIp': '0.0.0.0/0'}]}]})
+    {'IpPermissions': [{'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}]}
+    """
+    for key in ["IpPermissions", "IpPermissionsEgress"]:
+        for ip_permission in security_group.get(key, []):
+            ip_permission["IpRanges"] = ip_permission.pop("Ipv4Ranges", [])
+    return security_group
+
+
+AGGREGATOR_QUERIES: Dict[Tuple[str, str], AggregatorQuery] = {
+    ("ec2", "describe_instances"): AggregatorQuery(
+        resource_type="AWS::EC2::Instance",
+        call_kwargs={
+            "Filters": [
+                {"Name": "instance-state-name", "Values": ["pending", "running"]}
+            ]
+        },
+        wrap=lambda instances: {"Reservations": [{"Instances": instances}]},
+        keep=lambda instance: instance.get("State", {}).get("Name")
+        in ["pending", "running"],
+    ),
+    ("ec2", "describe_security_groups"): AggregatorQuery(
+        resource_type="AWS::EC2::SecurityGroup",
+        call_kwargs={},
+        wrap=lambda security_groups: {"SecurityGroups": security_groups},
+        fix=fix_security_group,
+    ),
+    ("ec2", "describe_volumes"): AggregatorQuery(
+        resource_type="AWS::EC2::Volume",
+        call_kwargs={},
+        wrap=lambda volumes: {"Volumes": volumes},
+    ),
+    ("s3", "list_buckets"): AggregatorQuery(
+        resource_type="AWS::S3::Bucket",
+        call_kwargs={},
+        wrap=lambda buckets: {"Buckets": buckets},
+    ),
+    ("rds", "describe_db_instances"): AggregatorQuery(
+        resource_type="AWS::RDS::DBInstance",
+        call_kwargs={},
+        wrap=lambda db_instances: {"DBInstances": db_instances},
+    ),
+}
+
+
+def pascal_case_keys(obj: Any) -> Any:
+    """
+    Recursively upper cases the first letter of dict keys to match
+    describe_* results.
+
+    >>> pascal_case_keys({'dBInstanceIdentifier': 'db', 'vpcSecurityGroups': [{'vpcSecurityGroupId': 'sg-1'}]})
+    {'DBInstanceIdentifier': 'db', 'VpcSecurityGroups': [{'VpcSecurityGroupId': 'sg-1'}]}
+    """
+    if isinstance(obj, dict):
+        return {
+            key[:1].upper() + key[1:]: pascal_case_keys(v) for key, v in obj.items()
+        }
+    elif isinstance(obj, list):
+        return [pascal_case_keys(item) for item in obj]
+    return obj
+
+
+def query_expression(query: AggregatorQuery) -> str:
+    """
+    >>> query_expression(AGGREGATOR_QUERIES[("s3", "list_buckets")])
+    "SELECT accountId, awsRegion, configuration WHERE resourceType = 'AWS::S3::Bucket'"
+    """
+    return "SELECT accountId, awsRegion, configuration WHERE resourceType = '{}'".format(
+        query.resource_type
+    )
+
+
+def results_from_configuration_items(
+    service_name: str,
+    query: AggregatorQuery,
+    configuration_items: List[Dict[str, Any]],
+    account_profiles: Dict[str, Optional[str]],
+    regions: List[str],
+) -> List[Dict[str, Any]]:
+    """
+    Groups configuration items by account and region and returns a
+    describe-shaped result for each, like get_aws_resource does per
+    profile and region. Results are tagged with the profile of their
+    account in account_profiles, so follow up calls reach the account,
+    and the account id is kept in __pytest_meta. Items of accounts
+    without a profile are skipped.
+
+    >>> items = [
+    ...     {'accountId': '123', 'awsRegion': 'us-east-1', 'configuration': {'volumeId': 'vol-1', 'encrypted': True}},
+    ...     {'accountId': '123', 'awsRegion': 'eu-west-1', 'configuration': {'volumeId': 'vol-2', 'encrypted': False}},
+    ...     {'accountId': '456', 'awsRegion': 'us-east-1', 'configuration': {'volumeId': 'vol-3', 'encrypted': False}},
+    ...     {'accountId': '789', 'awsRegion': 'us-east-1', 'configuration': {'volumeId': 'vol-4', 'encrypted': False}},
+    ... ]
+    >>> for result in results_from_configuration_items(
+    ...     "ec2", AGGREGATOR_QUERIES[("ec2", "describe_volumes")], items,
+    ...     {'123': None, '456': 'audit-456'}, ["us-east-1"]):
+    ...     print(result)
+    {'Volumes': [{'VolumeId': 'vol-1', 'Encrypted': True}], '__pytest_meta': {'profile': None, 'region': 'us-east-1', 'account_id': '123'}}
+    {'Volumes': [{'VolumeId': 'vol-3', 'Encrypted': False}], '__pytest_meta': {'profile': 'audit-456', 'region': 'us-east-1', 'account_id': '456'}}
+
+    Regions are not filtered for services without regions, which are
+    reported in us-east-1 as the describe calls are:
+
+    >>> results_from_configuration_items(
+    ...     "s3", AGGREGATOR_QUERIES[("s3", "list_buckets")],
+    ...     [{'accountId': '123', 'awsRegion': 'eu-west-1', 'configuration': {'name': 'b'}}], {'123': 'p'}, ["us-west-2"])
+    [{'Buckets': [{'Name': 'b'}], '__pytest_meta': {'profile': 'p', 'region': 'us-east-1', 'account_id': '123'}}]
+    """
+    resources_by_location: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(
+        list
+    )
+    for item in configuration_items:
+        if item["accountId"] not in account_profiles:
+            continue
+        elif service_name in SERVICES_WITHOUT_REGIONS:
+            region = "us-east-1"
+        elif item["awsRegion"] in regions:
+            region = item["awsRegion"]
+        else:
+            continue
+
+        resource = query.fix(pascal_case_keys(item["configuration"]))
+        if query.keep(resource):
+            resources_by_location[(item["accountId"], region)].append(resource)
+
+    return [
+        {
+            **query.wrap(resources),
+            "__pytest_meta": dict(
+                profile=account_profiles[account_id],
+                region=region,
+                account_id=account_id,
+            ),
+        }
+        for (account_id, region), resources in resources_by_location.items()
+    ]
+
+
+class ConfigAggregatorBackend:
+    """
+    Answers supported BotocoreClient calls from an AWS Config aggregator
+
+    The aggregator is queried with the given profile in the given region.
+    Only resources in the accounts of the tested profiles are returned, and
+    they are tagged with the profile of their account, so follow up
+    per-resource calls use credentials for that account.
+    """
+
+    def __init__(
+        self: "ConfigAggregatorBackend",
+        aggregator_name: str,
+        profile: Optional[str],
+        region: str,
+        profiles: List[Optional[str]],
+    ):
+        self.aggregator_name = aggregator_name
+        self.profile = profile
+        self.region = region
+        self.profiles = profiles
+        self._account_profiles: Optional[Dict[str, Optional[str]]] = None
+
+    def account_profiles(self: "ConfigAggregatorBackend") -> Dict[str, Optional[str]]:
+        """Returns the tested profiles by account id
+
+        >>> from aws.client import assumed_role_profile
+        >>> ConfigAggregatorBackend("org", None, "us-east-1", [
+        ...     assumed_role_profile("123", "FrostAudit"), assumed_role_profile("456", "FrostAudit"),
+        ... ]).account_profiles()
+        {'123': '123', '456': '456'}
+        """
+        if self._account_profiles is None:
+            self._account_profiles = {
+                get_profile_account_id(profile): profile for profile in self.profiles
+            }
+        return self._account_profiles
+
+    def handles(
+        self: "ConfigAggregatorBackend",
+        service_name: str,
+        method_name: str,
+        call_kwargs: Dict[str, Any],
+    ) -> bool:
+        """
+        >>> backend = ConfigAggregatorBackend("org", None, "us-east-1", [None])
+        >>> backend.handles("ec2", "describe_volumes", {})
+        True
+        >>> backend.handles("ec2", "describe_volumes", {"VolumeIds": ["vol-1"]})
+        False
+        >>> backend.handles("ec2", "describe_vpcs", {})
+        False
+        """
+        query = AGGREGATOR_QUERIES.get((service_name, method_name))
+        return query is not None and query.call_kwargs == call_kwargs
+
+    def get(
+        self: "ConfigAggregatorBackend",
+        service_name: str,
+        method_name: str,
+        regions: List[str],
+        cache: Optional[_pytest.cacheprovider.Cache],
+        debug_calls: bool = False,
+        debug_cache: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Returns describe-shaped results per account and region
+
+        >>> from botocore.stub import Stubber
+        >>> from aws.client import get_client
+        >>> stubber = Stubber(get_client(None, "us-east-1", "config"))
+        >>> stubber.add_response(
+        ...     "select_aggregate_resource_config",
+        ...     {"Results": ['{"accountId": "123", "awsRegion": "us-east-1", "configuration": {"groupId": "sg-1", '
+        ...                  '"ipPermissions": [{"ipRanges": ["0.0.0.0/0"], "ipv4Ranges": [{"cidrIp": "0.0.0.0/0"}]}]}}'],
+        ...      "NextToken": "page-2"},
+        ... )
+        >>> stubber.add_response(
+        ...     "select_aggregate_resource_config",
+        ...     {"Results": ['{"accountId": "456", "awsRegion": "us-east-1", "configuration": {"groupId": "sg-2"}}']},
+        ... )
+        >>> backend = ConfigAggregatorBackend("org", None, "us-east-1", [None])
+        >>> backend._account_profiles = {"123": None, "456": "456"}
+        >>> with stubber:
+        ...     results = backend.get(
+        ...         "ec2", "describe_security_groups", ["us-east-1"], cache=None)
+        >>> for result in results:
+        ...     print(result)
+        {'SecurityGroups': [{'GroupId': 'sg-1', 'IpPermissions': [{'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}]}], '__pytest_meta': {'profile': None, 'region': 'us-east-1', 'account_id': '123'}}
+        {'SecurityGroups': [{'GroupId': 'sg-2'}], '__pytest_meta': {'profile': '456', 'region': 'us-east-1', 'account_id': '456'}}
+        """
+        query = AGGREGATOR_QUERIES[(service_name, method_name)]
+        configuration_items = []
+        for response in get_aws_resource(
+            "config",
+            "select_aggregate_resource_config",
+            [],
+            {
+                "Expression": query_expression(query),
+                "ConfigurationAggregatorName": self.aggregator_name,
+            },
+            cache=cache,
+            profiles=[self.profile],
+            regions=[self.region],
+            debug_calls=debug_calls,
+            debug_cache=debug_cache,
+        ):
+            configuration_items.extend(
+                parse_configuration_items(response.get("Results", []))
+            )
+
+        return results_from_configuration_items(
+            service_name, query, configuration_items, self.account_profiles(), regions
+        )
+
+
+def parse_configuration_items(results: List[str]) -> List[Dict[str, Any]]:
+    """
+    Parses select_aggregate_resource_config JSON results converting ISO
+    datetime strings in configurations to datetimes like the cache does.
+
+    >>> parse_configuration_items(['{"accountId": "201901011200", "configuration": {"launchTime": "2019-01-01T00:00:00.000Z"}}'])
+    [{'accountId': '201901011200', 'configuration': {'launchTime': datetime.datetime(2019, 1, 1, 0, 0, tzinfo=tzutc())}}]
+    """
+    return [
+        json.loads(
+            result,
+            # leave the top level accountId and awsRegion as strings
+            object_hook=lambda obj: (
+                obj
+                if "configuration" in obj
+                else json_iso_datetime_string_to_datetime(obj)
+            ),
+        )
+        for result in results
+    ]
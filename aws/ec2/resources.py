@@ -1,6 +1,6 @@
 from collections import defaultdict
 
-from conftest import botocore_client
+from conftest import botocore_client, custom_config_global
 
 from aws.autoscaling.resources import autoscaling_launch_configurations
 from aws.elasticache.resources import elasticache_clusters
@@ -112,10 +112,62 @@ def ec2_addresses():
     )
 
 
+def ec2_network_interfaces():
+    "https://botocore.amazonaws.com/v1/documentation/api/latest/reference/services/ec2.html#EC2.Client.describe_network_interfaces"
+    return (
+        botocore_client.get("ec2", "describe_network_interfaces", [], {})
+        .extract_key("NetworkInterfaces")
+        .flatten()
+        .values()
+    )
+
+
+def ec2_launch_template_versions():
+    """
+    Returns the latest and default versions of all launch templates.
+
+    https://botocore.amazonaws.com/v1/documentation/api/latest/reference/services/ec2.html#EC2.Client.describe_launch_template_versions
+    """
+    return (
+        botocore_client.get(
+            "ec2",
+            "describe_launch_template_versions",
+            [],
+            {"Versions": ["$Latest", "$Default"]},
+        )
+        .extract_key("LaunchTemplateVersions")
+        .flatten()
+        .values()
+    )
+
+
 def ec2_security_groups_with_in_use_flag():
     """Returns security groups with an additional "InUse" key,
     which is True if it is associated with at least one resource.
 
+    By default attached groups are found by listing each kind of resource
+    (see ec2_security_group_ids_attached_to_resources). Setting the aws
+    config option security_groups_in_use_from to "network_interfaces"
+    uses one describe_network_interfaces sweep per region instead (see
+    ec2_security_group_ids_attached_to_network_interfaces).
+    """
+    sec_groups = ec2_security_groups()
+
+    if custom_config_global.aws.security_groups_in_use_from == "network_interfaces":
+        in_use_sec_group_ids = ec2_security_group_ids_attached_to_network_interfaces()
+    else:
+        in_use_sec_group_ids = ec2_security_group_ids_attached_to_resources()
+
+    for sec_group in sec_groups:
+        sec_group["InUse"] = sec_group["GroupId"] in in_use_sec_group_ids
+
+    return sec_groups
+
+
+def ec2_security_group_ids_attached_to_resources():
+    """Returns a dict of security group id to the number of resources
+    it is attached to.
+
     Possible resources:
     - EC2
     - ELBs (v1 and v2)
@@ -125,7 +177,6 @@ def ec2_security_groups_with_in_use_flag():
     - ElasticSearchService
     - AutoScaling
     """
-    sec_groups = ec2_security_groups()
     in_use_sec_group_ids = defaultdict(int)
 
     # These resources have their security groups under 'SecurityGroups'.
@@ -134,7 +185,7 @@ def ec2_security_groups_with_in_use_flag():
     resources = sum(
         [
             ec2_instances(),
-            elbs(),
+            elbs(with_tags=False),
             elbs_v2(),
             elasticache_clusters(),
             autoscaling_launch_configurations(),
@@ -142,18 +193,9 @@ def ec2_security_groups_with_in_use_flag():
         [],
     )
     for resource in resources:
-        for attached_sec_group in resource.get("SecurityGroups", []):
-            if isinstance(attached_sec_group, dict):
-                for key in ["SecurityGroupId", "GroupId"]:
-                    if key in attached_sec_group:
-                        in_use_sec_group_ids[attached_sec_group[key]] += 1
-            elif isinstance(attached_sec_group, str):
-                in_use_sec_group_ids[attached_sec_group] += 1
-            else:
-                raise Exception(
-                    "Got security group value with a type of %s"
-                    % type(attached_sec_group)
-                )
+        count_security_group_ids(
+            resource.get("SecurityGroups", []), in_use_sec_group_ids
+        )
 
     # These resources have two types of security groups, therefore
     # the Vpc ones are namespaced under "VpcSecurityGroups"
@@ -168,13 +210,71 @@ def ec2_security_groups_with_in_use_flag():
             for attached_sec_group in domain["VPCOptions"]["SecurityGroupIds"]:
                 in_use_sec_group_ids[attached_sec_group] += 1
 
-    for sec_group in sec_groups:
-        if sec_group["GroupId"] in in_use_sec_group_ids.keys():
-            sec_group["InUse"] = True
-        else:
-            sec_group["InUse"] = False
+    return in_use_sec_group_ids
 
-    return sec_groups
+
+def ec2_security_group_ids_attached_to_network_interfaces():
+    """Returns a dict of security group id to the number of network
+    interfaces and launch configurations/templates it is attached to.
+
+    Instances, load balancers, RDS, Redshift, ElastiCache and
+    Elasticsearch VPC resources all attach their security groups to
+    network interfaces. Launch configurations and templates have no
+    network interfaces until they launch an instance, so they are listed
+    separately.
+
+    Unlike ec2_security_group_ids_attached_to_resources this counts
+    groups of stopped instances as in use, since their interfaces remain.
+    """
+    in_use_sec_group_ids = defaultdict(int)
+
+    for network_interface in ec2_network_interfaces():
+        count_security_group_ids(
+            network_interface.get("Groups", []), in_use_sec_group_ids
+        )
+
+    for launch_configuration in autoscaling_launch_configurations():
+        count_security_group_ids(
+            launch_configuration.get("SecurityGroups", []), in_use_sec_group_ids
+        )
+
+    for launch_template_version in ec2_launch_template_versions():
+        launch_template_data = launch_template_version.get("LaunchTemplateData", {})
+        count_security_group_ids(
+            launch_template_data.get("SecurityGroupIds", []), in_use_sec_group_ids
+        )
+        for network_interface in launch_template_data.get("NetworkInterfaces", []):
+            count_security_group_ids(
+                network_interface.get("Groups", []), in_use_sec_group_ids
+            )
+
+    return in_use_sec_group_ids
+
+
+def count_security_group_ids(attached_sec_groups, counts):
+    """Increments counts for each attached security group, which may
+    be a group id or a dict with a SecurityGroupId or GroupId key.
+
+    >>> counts = defaultdict(int)
+    >>> count_security_group_ids(["sg-1", {"GroupId": "sg-2"}, {"SecurityGroupId": "sg-1"}], counts)
+    >>> dict(counts)
+    {'sg-1': 2, 'sg-2': 1}
+    >>> count_security_group_ids([1], counts)
+    Traceback (most recent call last):
+    ...
+    Exception: Got security group value with a type of <class 'int'>
+    """
+    for attached_sec_group in attached_sec_groups:
+        if isinstance(attached_sec_group, dict):
+            for key in ["SecurityGroupId", "GroupId"]:
+                if key in attached_sec_group:
+                    counts[attached_sec_group[key]] += 1
+        elif isinstance(attached_sec_group, str):
+            counts[attached_sec_group] += 1
+        else:
+            raise Exception(
+                "Got security group value with a type of %s" % type(attached_sec_group)
+            )
 
 
 def ec2_images_owned_by(account_ids):
@@ -1,34 +1,76 @@
+from collections import defaultdict
+
 from conftest import botocore_client
+from helpers import chunks
+
+# describe_elasticsearch_domains accepts at most 5 domain names per call
+DESCRIBE_DOMAINS_MAX_NAMES = 5
 
 
 def elasticsearch_domains():
     """
     http://botocore.readthedocs.io/en/latest/reference/services/es.html#ElasticsearchService.Client.describe_elasticsearch_domains
     """
-    # You can only get 5 at a time.
-    domains_list = list_elasticsearch_domains()
-    domains = []
-    for i in range(0, len(domains_list), 5):
-        domains += (
-            botocore_client.get(
-                "es",
-                "describe_elasticsearch_domains",
-                [],
-                {"DomainNames": domains_list[i : i + 5]},
-            )
-            .extract_key("DomainStatusList")
-            .flatten()
-            .values()
+    # Describe domains only in the profile and region they were listed in,
+    # 5 at a time, with the chunks fetched concurrently.
+    return sum(
+        botocore_client.map(
+            describe_elasticsearch_domains,
+            domain_name_chunks(list_elasticsearch_domain_names()),
+        ),
+        [],
+    )
+
+
+def describe_elasticsearch_domains(location_and_names):
+    "Describes a chunk of domain names in the profile and region they belong to"
+    (profile, region), domain_names = location_and_names
+    return (
+        botocore_client.get(
+            "es",
+            "describe_elasticsearch_domains",
+            [],
+            {"DomainNames": domain_names},
+            profiles=[profile],
+            regions=[region],
         )
-    return domains
+        .extract_key("DomainStatusList")
+        .flatten()
+        .values()
+    )
 
 
-def list_elasticsearch_domains():
-    "http://botocore.readthedocs.io/en/latest/reference/services/es.html#ElasticsearchService.Client.list_domain_names"
+def domain_name_chunks(domain_names):
+    """
+    Returns ((profile, region), names) pairs with at most 5 names grouped by
+    the profile and region the domains were listed in.
+
+    >>> domain_name_chunks([
+    ...     {"DomainName": "d{}".format(i), "__pytest_meta": {"profile": None, "region": "us-east-1"}}
+    ...     for i in range(6)
+    ... ] + [{"DomainName": "w", "__pytest_meta": {"profile": None, "region": "us-west-2"}}])
+    [((None, 'us-east-1'), ['d0', 'd1', 'd2', 'd3', 'd4']), ((None, 'us-east-1'), ['d5']), ((None, 'us-west-2'), ['w'])]
+    """
+    names_by_location = defaultdict(list)
+    for domain in domain_names:
+        location = (
+            domain["__pytest_meta"]["profile"],
+            domain["__pytest_meta"]["region"],
+        )
+        names_by_location[location].append(domain["DomainName"])
+
     return [
-        domain["DomainName"]
-        for domain in botocore_client.get("es", "list_domain_names", [], {})
+        (location, names_chunk)
+        for location, names in names_by_location.items()
+        for names_chunk in chunks(names, DESCRIBE_DOMAINS_MAX_NAMES)
+    ]
+
+
+def list_elasticsearch_domain_names():
+    "http://botocore.readthedocs.io/en/latest/reference/services/es.html#ElasticsearchService.Client.list_domain_names"
+    return (
+        botocore_client.get("es", "list_domain_names", [], {})
         .extract_key("DomainNames")
         .flatten()
         .values()
-    ]
+    )
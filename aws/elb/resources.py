@@ -1,5 +1,7 @@
 from conftest import botocore_client
 
+from aws.resourcegroupstaggingapi.resources import accounts_by_location, attach_tags
+
 
 def elbs(with_tags=True):
     """
@@ -15,28 +17,33 @@ def elbs(with_tags=True):
     if not with_tags:
         return elbs
 
-    elbs_with_tags = []
-    for elb in elbs:
-        tags = (
-            botocore_client.get(
-                service_name="elb",
-                method_name="describe_tags",
-                call_args=[],
-                call_kwargs={"LoadBalancerNames": [elb["LoadBalancerName"]]},
-                regions=[elb["__pytest_meta"]["region"]],
-            )
-            .extract_key("TagDescriptions")
-            .flatten()
-            .values()
-        )
-        # This check is probably unneeded
-        if len(tags) >= 1:
-            tags = tags[0]
-        if "Tags" in tags:
-            elb["Tags"] = tags["Tags"]
-        elbs_with_tags.append(elb)
+    return attach_tags(elbs, elb_arn)
+
 
-    return elbs_with_tags
+def elb_arn(elb, accounts=None):
+    """
+    Returns the ARN of a classic ELB, which describe_load_balancers does not include,
+    or None when the ELB's profile and region have no tagged resources.
+
+    The partition and account id come from the ARNs in the tag index.
+
+    >>> elb = {"LoadBalancerName": "lb", "__pytest_meta": {"profile": "p", "region": "us-gov-west-1"}}
+    >>> elb_arn(elb, accounts={("p", "us-gov-west-1"): ("aws-us-gov", "123456789012")})
+    'arn:aws-us-gov:elasticloadbalancing:us-gov-west-1:123456789012:loadbalancer/lb'
+    >>> elb_arn(elb, accounts={}) is None
+    True
+    """
+    if accounts is None:
+        accounts = accounts_by_location()
+
+    location = (elb["__pytest_meta"]["profile"], elb["__pytest_meta"]["region"])
+    if location not in accounts:
+        return None
+
+    partition, account_id = accounts[location]
+    return "arn:{}:elasticloadbalancing:{}:{}:loadbalancer/{}".format(
+        partition, location[1], account_id, elb["LoadBalancerName"]
+    )
 
 
 def elbs_v2():
@@ -61,13 +68,17 @@ def elb_attributes(elb):
             "describe_load_balancer_attributes",
             [],
             call_kwargs={"LoadBalancerName": elb["LoadBalancerName"]},
+            profiles=[elb["__pytest_meta"]["profile"]],
             regions=[elb["__pytest_meta"]["region"]],
         )
         .extract_key("LoadBalancerAttributes")
-        .debug()
         .values()
     )[0]
 
 
 def elbs_with_attributes():
-    return [(elb, elb_attributes(elb),) for elb in elbs(with_tags=False)]
+    """Returns (elb, attributes) pairs fetching attributes concurrently."""
+    elbs_without_tags = elbs(with_tags=False)
+    return list(
+        zip(elbs_without_tags, botocore_client.map(elb_attributes, elbs_without_tags))
+    )
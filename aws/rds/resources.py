@@ -1,5 +1,7 @@
 from conftest import botocore_client
 
+from aws.resourcegroupstaggingapi.resources import attach_tags
+
 
 def rds_db_instances():
     "http://botocore.readthedocs.io/en/latest/reference/services/rds.html#RDS.Client.describe_db_instances"
@@ -11,28 +13,11 @@ def rds_db_instances():
     )
 
 
-def rds_db_instance_tags(db):
-    "http://botocore.readthedocs.io/en/latest/reference/services/rds.html#RDS.Client.list_tags_for_resource"
-    return (
-        botocore_client.get(
-            service_name="rds",
-            method_name="list_tags_for_resource",
-            call_args=[],
-            call_kwargs={"ResourceName": db["DBInstanceArn"]},
-            profiles=[db["__pytest_meta"]["profile"]],
-            regions=[db["__pytest_meta"]["region"]],
-            result_from_error=lambda e, call: [],
-        )
-        .extract_key("TagList")
-        .flatten()
-        .values()
-    )
-
-
 def rds_db_instances_with_tags():
-    return [
-        {**{"TagList": rds_db_instance_tags(db=db)}, **db} for db in rds_db_instances()
-    ]
+    """Returns DB instances with their tags under "TagList" from the tag index"""
+    return attach_tags(
+        rds_db_instances(), lambda db: db["DBInstanceArn"], tags_key="TagList"
+    )
 
 
 def rds_db_instances_vpc_security_groups():
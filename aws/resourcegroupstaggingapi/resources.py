@@ -0,0 +1,113 @@
+import functools
+
+from conftest import botocore_client
+
+
+def tagged_resources():
+    "https://botocore.amazonaws.com/v1/documentation/api/latest/reference/services/resourcegroupstaggingapi.html#ResourceGroupsTaggingAPI.Client.get_resources"
+    return (
+        botocore_client.get(
+            "resourcegroupstaggingapi",
+            "get_resources",
+            [],
+            {},
+            # treat a missing tag:GetResources permission or unsupported region as no tags
+            result_from_error=lambda e, call: {"ResourceTagMappingList": []},
+        )
+        .extract_key("ResourceTagMappingList")
+        .flatten()
+        .values()
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def tags_by_arn():
+    """
+    Returns a dict of resource ARN to its list of {"Key": ..., "Value": ...}
+    tags for all tagged resources in every profile and region.
+
+    Only tagged (or previously tagged) resources are returned by the API,
+    so a missing ARN means the resource has no tags.
+    """
+    return {
+        resource["ResourceARN"]: resource.get("Tags", [])
+        for resource in tagged_resources()
+    }
+
+
+def arn_partition_and_account(arn):
+    """
+    Returns the partition and account id of an ARN. The account id is empty for
+    resources with globally unique names e.g. S3 buckets.
+
+    >>> arn_partition_and_account("arn:aws-cn:rds:cn-north-1:123456789012:db:db-1")
+    ('aws-cn', '123456789012')
+    >>> arn_partition_and_account("arn:aws:s3:::bucket")
+    ('aws', '')
+    """
+    parts = arn.split(":")
+    return parts[1], parts[4]
+
+
+def accounts_by_location(resources=None):
+    """
+    Returns a dict of (profile, region) to the (partition, account id) of the
+    tagged resources there, so ARNs can be built without STS calls. ARNs
+    without an account id are skipped.
+
+    Locations without tagged resources are missing, and resources in them
+    have no tags to look up.
+
+    >>> meta = {"profile": "p", "region": "us-east-1"}
+    >>> accounts_by_location([
+    ...     {"ResourceARN": "arn:aws:rds:us-east-1:123456789012:db:db-1", "__pytest_meta": meta},
+    ...     {"ResourceARN": "arn:aws:s3:::bucket", "__pytest_meta": meta},
+    ... ])
+    {('p', 'us-east-1'): ('aws', '123456789012')}
+    """
+    if resources is None:
+        return _accounts_by_location()
+
+    accounts = {}
+    for resource in resources:
+        partition, account_id = arn_partition_and_account(resource["ResourceARN"])
+        if account_id:
+            location = (
+                resource["__pytest_meta"]["profile"],
+                resource["__pytest_meta"]["region"],
+            )
+            accounts[location] = (partition, account_id)
+    return accounts
+
+
+@functools.lru_cache(maxsize=1)
+def _accounts_by_location():
+    return accounts_by_location(tagged_resources())
+
+
+def attach_tags(resources, get_arn, tags_key="Tags", tags=None):
+    """
+    Adds tags to each resource under tags_key by looking up the ARN
+    returned by get_arn in the tag index, and returns the resources.
+    Resources that already have tags_key are left as is.
+
+    >>> index = {"arn:aws:rds:us-east-1:123456789012:db:db-1": [{"Key": "App", "Value": "frost"}]}
+    >>> attach_tags(
+    ...     [{"DBInstanceArn": "arn:aws:rds:us-east-1:123456789012:db:db-1"},
+    ...      {"DBInstanceArn": "arn:aws:rds:us-east-1:123456789012:db:db-2"}],
+    ...     lambda db: db["DBInstanceArn"],
+    ...     tags_key="TagList",
+    ...     tags=index,
+    ... )  # doctest: +NORMALIZE_WHITESPACE
+    [{'DBInstanceArn': 'arn:aws:rds:us-east-1:123456789012:db:db-1', 'TagList': [{'Key': 'App', 'Value': 'frost'}]},
+     {'DBInstanceArn': 'arn:aws:rds:us-east-1:123456789012:db:db-2', 'TagList': []}]
+    >>> attach_tags([{"Id": "a", "Tags": [{"Key": "Name", "Value": "x"}]}], lambda r: r["Id"], tags={})
+    [{'Id': 'a', 'Tags': [{'Key': 'Name', 'Value': 'x'}]}]
+    """
+    if tags is None:
+        tags = tags_by_arn()
+
+    for resource in resources:
+        if tags_key not in resource:
+            resource[tags_key] = tags.get(get_arn(resource), [])
+    return resources
@@ -13,19 +13,42 @@ def zones():
     )
 
 
-def cnames():
-    records = []
-
-    for zone in zones():
-        zone_id = zone["Id"].split("/")[2]
-        zone_records = (
-            botocore_client.get(
-                "route53", "list_resource_record_sets", [], {"HostedZoneId": zone_id}
-            )
-            .extract_key("ResourceRecordSets")
-            .flatten()
-            .values()
+def cname_records_page(page):
+    """
+    Keeps only the CNAME records from a list_resource_record_sets page.
+
+    >>> cname_records_page({"ResourceRecordSets": [{"Type": "A"}, {"Type": "CNAME"}], "IsTruncated": False})
+    {'ResourceRecordSets': [{'Type': 'CNAME'}]}
+    """
+    return {
+        "ResourceRecordSets": [
+            record
+            for record in page.get("ResourceRecordSets", [])
+            if record["Type"] == "CNAME"
+        ]
+    }
+
+
+def zone_cnames(zone):
+    """
+    https://botocore.amazonaws.com/v1/documentation/api/latest/reference/services/route53.html#Route53.Client.list_resource_record_sets
+    """
+    zone_id = zone["Id"].split("/")[2]
+    return (
+        botocore_client.get(
+            "route53",
+            "list_resource_record_sets",
+            [],
+            {"HostedZoneId": zone_id},
+            profiles=[zone["__pytest_meta"]["profile"]],
+            page_filter=cname_records_page,
         )
-        records.extend([record for record in zone_records if record["Type"] == "CNAME"])
+        .extract_key("ResourceRecordSets")
+        .flatten()
+        .values()
+    )
+
 
-    return records
+def cnames():
+    """Returns CNAME records from all hosted zones, scanning zones concurrently"""
+    return sum(botocore_client.map(zone_cnames, zones()), [])
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from conftest import botocore_client
 
 
@@ -27,22 +29,62 @@ def sns_topic_arns():
 
 
 def sns_subscriptions_by_topic():
-    "https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sns.html#topic"
+    """
+    Returns topics with their subscriptions under "Subscriptions", grouping
+    the list_subscriptions results by TopicArn instead of calling
+    list_subscriptions_by_topic for every topic.
+
+    list_subscriptions only returns subscriptions owned by the scanning
+    account, so topics left without subscriptions, e.g. with only
+    cross-account SQS or Lambda subscribers, are looked up with
+    list_subscriptions_by_topic (concurrently).
+
+    https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sns.html#topic
+    """
+    topics = join_subscriptions_to_topics(sns_topics(), sns_subscriptions())
+    topics_without_subscriptions = [
+        topic for topic in topics if not topic["Subscriptions"]
+    ]
+    for topic, subscriptions in zip(
+        topics_without_subscriptions,
+        botocore_client.map(sns_topic_subscriptions, topics_without_subscriptions),
+    ):
+        topic["Subscriptions"] = subscriptions
+    return topics
+
+
+def sns_topic_subscriptions(topic):
+    "https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sns.html#SNS.Client.list_subscriptions_by_topic"
+    return (
+        botocore_client.get(
+            service_name="sns",
+            method_name="list_subscriptions_by_topic",
+            call_args=[],
+            call_kwargs={"TopicArn": topic["TopicArn"]},
+            profiles=[topic["__pytest_meta"]["profile"]],
+            regions=[topic["__pytest_meta"]["region"]],
+        )
+        .extract_key("Subscriptions")
+        .values()[0]
+    )
+
+
+def join_subscriptions_to_topics(topics, subscriptions):
+    """
+    >>> join_subscriptions_to_topics(
+    ...     [{"TopicArn": "arn:a"}, {"TopicArn": "arn:b"}],
+    ...     [{"TopicArn": "arn:a", "SubscriptionArn": "arn:a:1"}, {"TopicArn": "arn:c", "SubscriptionArn": "arn:c:1"}],
+    ... )
+    [{'Subscriptions': [{'TopicArn': 'arn:a', 'SubscriptionArn': 'arn:a:1'}], 'TopicArn': 'arn:a'}, {'Subscriptions': [], 'TopicArn': 'arn:b'}]
+    """
+    subscriptions_by_topic_arn = defaultdict(list)
+    for subscription in subscriptions:
+        subscriptions_by_topic_arn[subscription["TopicArn"]].append(subscription)
+
     return [
         {
-            **{
-                "Subscriptions": botocore_client.get(
-                    service_name="sns",
-                    method_name="list_subscriptions_by_topic",
-                    call_args=[],
-                    call_kwargs={"TopicArn": topic["TopicArn"]},
-                    profiles=[topic["__pytest_meta"]["profile"]],
-                    regions=[topic["__pytest_meta"]["region"]],
-                )
-                .extract_key("Subscriptions")
-                .values()[0]
-            },
+            **{"Subscriptions": subscriptions_by_topic_arn.get(topic["TopicArn"], [])},
             **topic,
         }
-        for topic in sns_topics()
+        for topic in topics
     ]
@@ -1,14 +1,14 @@
 import argparse
 import datetime
+import functools
+import threading
+import warnings
 
 import pytest
 
 from _pytest.doctest import DoctestItem
 from _pytest.mark import Mark, MarkDecorator
 from cache import patch_cache_set
-from aws.client import BotocoreClient
-from gcp.client import GCPClient
-from gsuite.client import GsuiteClient
 
 import custom_config
 
@@ -18,6 +18,22 @@ gsuite_client = None
 custom_config_global = None
 
 
+def positive_int(value):
+    """argparse type for options that must be at least 1
+
+    >>> positive_int("4")
+    4
+    >>> positive_int("0")
+    Traceback (most recent call last):
+    ...
+    argparse.ArgumentTypeError: 0 is not a positive integer
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("{} is not a positive integer".format(value))
+    return number
+
+
 def pytest_addoption(parser):
     frost_parser = parser.getgroup("Frost", "Frost's custom arguments")
     frost_parser.addoption(
@@ -32,6 +48,37 @@ def pytest_addoption(parser):
         help="Set AWS regions to use as a comma separate list. Defaults to all available AWS regions",
     )
 
+    frost_parser.addoption(
+        "--aws-organization-role",
+        type=str,
+        help="Name of an IAM role to assume in each AWS account to test. Uses the first --aws-profiles profile to assume it.",
+    )
+
+    frost_parser.addoption(
+        "--aws-accounts",
+        nargs="*",
+        help="AWS account ids to assume --aws-organization-role in. Defaults to all active accounts in the organization.",
+    )
+
+    frost_parser.addoption(
+        "--aws-model-cache-dir",
+        type=str,
+        help="Directory to save parsed botocore service models in and load them from in later runs.",
+    )
+
+    frost_parser.addoption(
+        "--aws-config-aggregator",
+        type=str,
+        help="Name of an AWS Config aggregator to fetch EC2 instances, security groups, volumes, S3 buckets and RDS instances from.",
+    )
+
+    frost_parser.addoption(
+        "--aws-config-aggregator-region",
+        type=str,
+        default="us-east-1",
+        help="AWS region of the --aws-config-aggregator. Defaults to us-east-1.",
+    )
+
     frost_parser.addoption(
         "--gcp-project-id", type=str, help="Set GCP project to test.",
     )
@@ -42,6 +89,32 @@ def pytest_addoption(parser):
         help="Set GCP folder to test. Will test all projects under this folder.",
     )
 
+    frost_parser.addoption(
+        "--gcp-folder-cache-ttl",
+        type=int,
+        default=3600,
+        help="Seconds to reuse the cached projects of a --gcp-folder-id. Defaults to 3600.",
+    )
+
+    frost_parser.addoption(
+        "--gcp-max-qps",
+        type=float,
+        default=10,
+        help="Maximum GCP API requests per second for each API in each project. Defaults to 10.",
+    )
+
+    frost_parser.addoption(
+        "--gcp-asset-inventory-export",
+        type=str,
+        help="Path of a newline-delimited JSON Cloud Asset Inventory export to read GCP firewalls, networks, instances, SQL instances and service accounts from.",
+    )
+
+    frost_parser.addoption(
+        "--gcp-discovery-dir",
+        type=str,
+        help="Directory of static GCP API discovery documents named <api>.<version>.json to build services from without fetching them.",
+    )
+
     # While only used for Heroku at the moment, GitHub tests are soon to be
     # added, which will also need an "organization" option. Current plan is to
     # reuse this one.
@@ -61,6 +134,27 @@ def pytest_addoption(parser):
         help="Log whether API calls hit the cache. Requires -s",
     )
 
+    frost_parser.addoption(
+        "--max-workers",
+        type=positive_int,
+        default=8,
+        help="Maximum number of concurrent API requests per service client. Use 1 to make requests serially.",
+    )
+
+    frost_parser.addoption(
+        "--gsuite-cache-ttl",
+        type=int,
+        default=3600,
+        help="Seconds to reuse cached GSuite users, groups and members. Defaults to 3600.",
+    )
+
+    frost_parser.addoption(
+        "--google-http-pool-size",
+        type=int,
+        default=10,
+        help="Connections to keep alive per host for GCP and GSuite API requests. Use 0 to send requests with a new httplib2 transport per thread. Defaults to 10.",
+    )
+
     frost_parser.addoption(
         "--offline",
         action="store_true",
@@ -85,59 +179,176 @@ def pytest_configure(config):
         # monkeypatch cache.set to serialize datetime.datetime's
         patch_cache_set(config)
 
+    project_id = config.getoption("--gcp-project-id")
+    folder_id = config.getoption("--gcp-folder-id")
+    if project_id is not None and folder_id is not None:
+        raise Exception(
+            "--gcp-project-id and --gcp-folder-id are mutually exclusive arguments"
+        )
+
+    custom_config_global = custom_config.CustomConfig(config.getoption("--config"))
+    config.custom_config = custom_config_global
+
+    # Provider clients (and their API client libraries) are only imported
+    # and initialized when a resource function first uses them, so e.g. an
+    # AWS only run does not load the GCP discovery client or walk GCP folders.
+    botocore_client = LazyClient(functools.partial(make_botocore_client, config, cache))
+    gcp_client = LazyClient(functools.partial(make_gcp_client, config, cache))
+    gsuite_client = LazyClient(functools.partial(make_gsuite_client, config, cache))
+
+    # register custom marker for rationale (used in report)
+    config.addinivalue_line(
+        "markers",
+        "rationale(reason): (optional) rationale behind the test. (null if not set)",
+    )
+
+
+class LazyClient:
+    """Proxies attribute access to a client created on first use
+
+    >>> lazy = LazyClient(lambda: print("creating") or "client")
+    >>> lazy.upper()
+    creating
+    'CLIENT'
+    >>> lazy.title()
+    'Client'
+    >>> lazy.is_created()
+    True
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def is_created(self):
+        return self._client is not None
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return getattr(self._client, name)
+
+
+def make_botocore_client(config, cache):
+    import botocore.exceptions
+
+    from aws.client import (
+        BotocoreClient,
+        assumed_role_profile,
+        configure_model_cache,
+        get_assumed_role_credentials,
+        get_organization_account_ids,
+    )
+    from aws.config_aggregator import ConfigAggregatorBackend
+
+    configure_model_cache(config.getoption("--aws-model-cache-dir"))
+
     profiles = config.getoption("--aws-profiles")
+    source_profile = profiles[0] if profiles else None
+
+    # scan each organization account with a profile assuming the role in it
+    organization_role = config.getoption("--aws-organization-role")
+    if organization_role and not config.getoption("--offline"):
+        account_ids = config.getoption(
+            "--aws-accounts"
+        ) or get_organization_account_ids(source_profile)
+        profiles = []
+        for account_id in account_ids:
+            profile = assumed_role_profile(
+                account_id, organization_role, source_profile
+            )
+            # assume each role up front so a failure skips the account instead
+            # of erroring in the middle of fetching resources
+            try:
+                get_assumed_role_credentials(profile)
+            except botocore.exceptions.ClientError as error:
+                warnings.warn(
+                    "skipping AWS account {}: could not assume {}: {}".format(
+                        account_id, organization_role, error
+                    )
+                )
+                continue
+            profiles.append(profile)
+        if not profiles:
+            raise Exception(
+                "could not assume {} in any AWS account".format(organization_role)
+            )
+
     aws_regions = (
         config.getoption("--aws-regions").split(",")
         if config.getoption("--aws-regions")
         else []
     )
 
-    project_id = config.getoption("--gcp-project-id")
-    folder_id = config.getoption("--gcp-folder-id")
-    if project_id is not None and folder_id is not None:
-        raise Exception(
-            "--gcp-project-id and --gcp-folder-id are mutually exclusive arguments"
+    config_aggregator = None
+    if config.getoption("--aws-config-aggregator"):
+        config_aggregator = ConfigAggregatorBackend(
+            aggregator_name=config.getoption("--aws-config-aggregator"),
+            profile=source_profile,
+            region=config.getoption("--aws-config-aggregator-region"),
+            profiles=profiles or [None],
         )
 
-    organization = config.getoption("--organization")
-
-    botocore_client = BotocoreClient(
+    return BotocoreClient(
         profiles=profiles,
         regions=aws_regions,
         cache=cache,
         debug_calls=config.getoption("--debug-calls"),
         debug_cache=config.getoption("--debug-cache"),
         offline=config.getoption("--offline"),
+        max_workers=config.getoption("--max-workers"),
+        config_aggregator=config_aggregator,
     )
 
-    gcp_client = GCPClient(
-        project_id=project_id,
-        folder_id=folder_id,
+
+def make_gcp_client(config, cache):
+    from gcp.asset_inventory import AssetInventoryBackend
+    from gcp.client import GCPClient
+
+    asset_inventory = None
+    if config.getoption("--gcp-asset-inventory-export"):
+        asset_inventory = AssetInventoryBackend(
+            config.getoption("--gcp-asset-inventory-export")
+        )
+
+    return GCPClient(
+        project_id=config.getoption("--gcp-project-id"),
+        folder_id=config.getoption("--gcp-folder-id"),
         cache=cache,
         debug_calls=config.getoption("--debug-calls"),
         debug_cache=config.getoption("--debug-cache"),
         offline=config.getoption("--offline"),
+        discovery_dir=config.getoption("--gcp-discovery-dir"),
+        max_workers=config.getoption("--max-workers"),
+        folder_cache_ttl=config.getoption("--gcp-folder-cache-ttl"),
+        asset_inventory=asset_inventory,
+        max_qps=config.getoption("--gcp-max-qps"),
+        http_pool_size=config.getoption("--google-http-pool-size"),
     )
 
-    custom_config_global = custom_config.CustomConfig(config.getoption("--config"))
-    config.custom_config = custom_config_global
+
+def make_gsuite_client(config, cache):
+    from gsuite.client import GsuiteClient
 
     try:
         if any(x for x in config.args if "gsuite" in x):
-            gsuite_client = GsuiteClient(
+            return GsuiteClient(
                 domain=config.custom_config.gsuite.domain,
                 offline=config.getoption("--offline"),
+                http_pool_size=config.getoption("--google-http-pool-size"),
+                max_workers=config.getoption("--max-workers"),
+                cache=cache,
+                debug_calls=config.getoption("--debug-calls"),
+                debug_cache=config.getoption("--debug-cache"),
+                cache_ttl=config.getoption("--gsuite-cache-ttl"),
             )
         else:
-            gsuite_client = GsuiteClient(domain="", offline=True)
+            return GsuiteClient(domain="", offline=True)
     except AttributeError as e:
-        gsuite_client = GsuiteClient(domain="", offline=True)
-
-    # register custom marker for rationale (used in report)
-    config.addinivalue_line(
-        "markers",
-        "rationale(reason): (optional) rationale behind the test. (null if not set)",
-    )
+        return GsuiteClient(domain="", offline=True)
 
 
 @pytest.fixture
@@ -150,6 +361,20 @@ def gcp_config(pytestconfig):
     return pytestconfig.custom_config.gcp
 
 
+def pytest_terminal_summary(terminalreporter):
+    """
+    Report API client stats (e.g. GCP service builds) for clients used in the run.
+    """
+    for name, client in [("GCP", gcp_client), ("GSuite", gsuite_client)]:
+        if client is None or not client.is_created():
+            continue
+        stats = getattr(client, "stats", None)
+        if stats:
+            terminalreporter.write_sep("-", "{} client stats".format(name))
+            for key, count in sorted(stats.items()):
+                terminalreporter.write_line("{}: {}".format(key, count))
+
+
 def pytest_runtest_setup(item):
     """
     Add custom markers to pytest tests.
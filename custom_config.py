@@ -83,6 +83,9 @@ class AWSConfig(CustomConfigMixin):
             str(x) for x in config.get("owned_ami_account_ids", [])
         ]
         self.max_ami_age_in_days = config.get("max_ami_age_in_days", 180)
+        self.security_groups_in_use_from = config.get(
+            "security_groups_in_use_from", "resources"
+        )
         super().__init__(config)
 
     def get_access_key_expiration_date(self):
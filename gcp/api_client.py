@@ -0,0 +1,375 @@
+"""
+Request execution and caching shared by the GCP and GSuite API clients
+
+GoogleAPIClient executes discovery based API requests from up to max_workers
+threads. Requests are rate limited per API and project, retried with
+exponential backoff on transient and rate limit errors, and per-item
+requests can be sent in batch requests. Results are cached in the pytest
+cache, optionally with the time they were fetched to expire them.
+"""
+
+import hashlib
+import random
+import socket
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import google.auth
+import google_auth_httplib2
+import httplib2
+from apiclient.errors import HttpError
+
+from gcp.transport import AuthorizedSessionHttp
+from helpers import chunks
+
+DEFAULT_MAX_WORKERS = 8
+
+# requests per batch request, the batch endpoints accept up to 1000
+BATCH_SIZE = 100
+
+# retry requests failing with these statuses or rate limit errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = [b"rateLimitExceeded", b"userRateLimitExceeded"]
+DEFAULT_MAX_RETRIES = 5
+# seconds to wait before the first retry, doubling for each following retry
+BACKOFF_BASE = 1
+BACKOFF_MAX = 32
+
+# requests per second to send to each API for each project
+DEFAULT_MAX_QPS = 10
+
+
+def call_cache_key(path_parts, call="list", id_value="na", fields=None):
+    """Returns the fullname (directory and filename) for a cached API call in the
+    path_parts directories.
+
+    >>> call_cache_key(["pytest_gcp", "123", "v1", "compute", "firewalls"], "get", "321")
+    'pytest_gcp/123/v1/compute/firewalls/get:321.json'
+
+    Partial responses are cached separately by a hash of their fields:
+
+    >>> call_cache_key(["pytest_gsuite", "example.com", "users"], fields="id,name")
+    'pytest_gsuite/example.com/users/list:na:fields-bab7fcd2.json'
+    """
+    path = "/".join(path_parts)
+    parts = [call, id_value]
+    if fields is not None:
+        parts.append("fields-" + hashlib.md5(fields.encode("utf-8")).hexdigest()[:8])
+    filename = ":".join(parts) + ".json"
+    return f"{path}/{filename}"
+
+
+def list_fields(results_key, fields, items_key=None):
+    """Returns the partial response fields parameter for a list call
+    returning only fields of each resource.
+
+    >>> list_fields("items", "id,name")
+    'nextPageToken,items(id,name)'
+
+    For aggregated list calls items_key is the key of the resources in
+    each zone or region:
+
+    >>> list_fields("items", "id,name", "instances")
+    'nextPageToken,items/*/instances(id,name)'
+    """
+    if items_key is not None:
+        results_key = results_key + "/*/" + items_key
+    return "nextPageToken,{}({})".format(results_key, fields)
+
+
+def is_retryable_error(error):
+    """Returns whether a request failed with a transient or rate limit error.
+
+    >>> from httplib2 import Response
+    >>> is_retryable_error(HttpError(Response({"status": 503}), b""))
+    True
+    >>> is_retryable_error(HttpError(Response({"status": 403}), b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'))
+    True
+    >>> is_retryable_error(HttpError(Response({"status": 403}), b'{"error": {"errors": [{"reason": "forbidden"}]}}'))
+    False
+    >>> is_retryable_error(ConnectionResetError())
+    True
+
+    Batch errors for malformed batch responses may have no response:
+
+    >>> from googleapiclient.errors import BatchError
+    >>> is_retryable_error(BatchError("Invalid response"))
+    False
+    """
+    if isinstance(error, HttpError):
+        if error.resp is None:
+            return False
+        if error.resp.status in RETRY_STATUSES:
+            return True
+        return error.resp.status == 403 and any(
+            reason in error.content for reason in RATE_LIMIT_REASONS
+        )
+    return isinstance(error, (ConnectionError, socket.timeout))
+
+
+def backoff_delay(attempt):
+    """Returns a random delay in seconds before retry attempt (from 0) with
+    exponential backoff and full jitter.
+
+    >>> all(0 <= backoff_delay(3) <= 8 for _ in range(100))
+    True
+    >>> all(0 <= backoff_delay(30) <= BACKOFF_MAX for _ in range(100))
+    True
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request_quota_key(uri):
+    """Returns the API and project id of a request URI, or "-" when it is
+    not for a project.
+
+    >>> request_quota_key("https://compute.googleapis.com/compute/v1/projects/p/aggregated/instances?alt=json")
+    ('compute', 'p')
+    >>> request_quota_key("https://www.googleapis.com/bigquery/v2/projects/p/datasets?alt=json")
+    ('bigquery', 'p')
+    >>> request_quota_key("https://cloudresourcemanager.googleapis.com/v1/projects/p:getIamPolicy?alt=json")
+    ('cloudresourcemanager', 'p')
+    >>> request_quota_key("https://cloudresourcemanager.googleapis.com/v2/folders?parent=folders%2F1&alt=json")
+    ('cloudresourcemanager', '-')
+    >>> request_quota_key("https://admin.googleapis.com/admin/directory/v1/groups/g/members?alt=json")
+    ('admin', '-')
+    """
+    parsed = urllib.parse.urlparse(uri)
+    path = parsed.path.strip("/").split("/")
+    api = parsed.netloc.split(".")[0]
+    if api == "www":
+        api = path[0]
+
+    project_id = "-"
+    if "projects" in path[:-1]:
+        project_id = path[path.index("projects") + 1].split(":")[0]
+    return api, project_id
+
+
+class QPSLimiter:
+    """Spaces out requests to at most qps requests per second
+
+    >>> limiter = QPSLimiter(qps=20)
+    >>> limiter.wait()
+    0
+    >>> 0 < limiter.wait(2) <= 0.05
+    True
+    """
+
+    def __init__(self, qps):
+        self.interval = 1 / qps
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self, count=1):
+        """Waits until count requests can be sent and returns the seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + count * self.interval
+
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+            return delay
+        return 0
+
+
+class GoogleAPIClient:
+    """
+    Base class for Google API clients executing requests from up to max_workers
+    threads with the OAuth scopes of the subclass, and caching results in cache.
+
+    Requests to each API for each project are spaced out to at most max_qps per
+    second, and transient and rate limit errors are retried up to max_retries
+    times. Requests are sent with one pooled transport of http_pool_size
+    connections for all threads or, without http_pool_size, an httplib2
+    transport per thread.
+    """
+
+    scopes = []
+
+    def __init__(
+        self,
+        cache=None,
+        debug_calls=False,
+        debug_cache=False,
+        max_workers=DEFAULT_MAX_WORKERS,
+        max_qps=DEFAULT_MAX_QPS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        http_pool_size=None,
+    ):
+        self.cache = cache
+        self.debug_calls = debug_calls
+        self.debug_cache = debug_cache
+        self.max_workers = max_workers
+        self.max_qps = max_qps
+        self.max_retries = max_retries
+        # connections to keep alive per host with a pooled transport
+        self.http_pool_size = http_pool_size
+
+        # counts of service builds, retries, etc. reported at the end of a run
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        # QPSLimiters by (api, project id)
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+        # httplib2 is not thread-safe so without a pooled transport each thread
+        # executes requests with its own transport
+        self._local = threading.local()
+        self._http_lock = threading.Lock()
+        self._shared_http = None
+        self._credentials = None
+
+    def _execute_batches(self, service, requests):
+        """
+        Internal helper executing requests to service in batch requests of up to
+        BATCH_SIZE, running up to max_workers batches at a time. Requests failing in
+        a batch with a transient or rate limit error are retried one at a time.
+        Returns a (response, exception) tuple for each request in order.
+        """
+        responses = {}
+
+        def callback(request_id, response, exception):
+            responses[request_id] = (response, exception)
+
+        def execute_batch(batch_requests):
+            batch = service.new_batch_http_request(callback=callback)
+            for i, request in batch_requests:
+                batch.add(request, request_id=str(i))
+            # a batch counts as one request against max_qps, requests in it
+            # that are rate limited are retried one at a time below
+            self._execute(batch, quota_key=request_quota_key(batch_requests[0][1].uri))
+
+        self._map(execute_batch, chunks(list(enumerate(requests)), BATCH_SIZE))
+
+        results = []
+        for i, request in enumerate(requests):
+            response, error = responses[str(i)]
+            if error is not None and is_retryable_error(error):
+                # retry requests failing in a batch one at a time
+                self._count("retries: {}".format(request_quota_key(request.uri)[0]))
+                try:
+                    response, error = self._execute(request), None
+                except HttpError as e:
+                    error = e
+            results.append((response, error))
+        return results
+
+    def _execute(self, request, quota_key=None):
+        """
+        Internal helper executing a request with the calling thread's transport. Waits
+        to send at most max_qps requests per second to each API for each project, and
+        retries transient and rate limit errors up to max_retries times with jittered
+        exponential backoff.
+
+        quota_key is the (api, project id) of the request, by default from its URI e.g.
+        for batch requests, which have the URI of the batch endpoint.
+        """
+        api, project_id = quota_key or request_quota_key(request.uri)
+        limiter = self._limiter(api, project_id)
+        for attempt in range(self.max_retries + 1):
+            if limiter.wait():
+                self._count("throttle waits: {}".format(api))
+            try:
+                return request.execute(http=self._http())
+            except (HttpError, ConnectionError, socket.timeout) as e:
+                if attempt == self.max_retries or not is_retryable_error(e):
+                    raise e
+                self._count("retries: {}".format(api))
+                time.sleep(backoff_delay(attempt))
+
+    def _limiter(self, api, project_id):
+        with self._limiters_lock:
+            key = (api, project_id)
+            if key not in self._limiters:
+                self._limiters[key] = QPSLimiter(self.max_qps)
+            return self._limiters[key]
+
+    def _count(self, stat, count=1):
+        with self._stats_lock:
+            self.stats[stat] += count
+
+    def _map(self, fn, items):
+        """
+        Internal helper returning fn(item) for each item in order, calling fn from up to
+        max_workers threads.
+
+        >>> client = GoogleAPIClient(max_workers=3)
+        >>> list(client._map(lambda x: x * 2, range(5)))
+        [0, 2, 4, 6, 8]
+        """
+        items = list(items)
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fn, items))
+
+    def _http(self):
+        """
+        Internal helper returning the authorized HTTP transport to execute requests with.
+        Service objects are shared between threads, so requests are executed with
+        either one pooled transport for all threads or, without http_pool_size, an
+        httplib2 transport per thread.
+        """
+        if self.http_pool_size:
+            with self._http_lock:
+                if self._shared_http is None:
+                    self._shared_http = AuthorizedSessionHttp(
+                        self._get_credentials(), self.http_pool_size
+                    )
+                return self._shared_http
+
+        http = getattr(self._local, "http", None)
+        if http is None:
+            with self._http_lock:
+                credentials = self._get_credentials()
+            http = google_auth_httplib2.AuthorizedHttp(
+                credentials, http=httplib2.Http()
+            )
+            self._local.http = http
+        return http
+
+    def _get_credentials(self):
+        if self._credentials is None:
+            self._credentials, _ = google.auth.default(scopes=self.scopes)
+        return self._credentials
+
+    def _get_cached(self, ckey):
+        """Internal helper returning the cached value for ckey or None"""
+        if self.cache is None:
+            return None
+
+        cached_result = self.cache.get(ckey, None)
+        if cached_result is not None and self.debug_cache:
+            print("found cached value for", ckey)
+        return cached_result
+
+    def _set_cached(self, ckey, value):
+        if self.cache is None:
+            return
+
+        if self.debug_cache:
+            print("setting cache value for", ckey)
+        self.cache.set(ckey, value)
+
+    def _get_cached_with_ttl(self, ckey, ttl):
+        """
+        Internal helper returning the value cached with _set_cached_with_ttl for ckey
+        less than ttl seconds ago or None
+        """
+        cached_result = self._get_cached(ckey)
+        if (
+            cached_result is not None
+            and "value" in cached_result
+            and time.time() - cached_result["fetchedAt"] < ttl
+        ):
+            return cached_result["value"]
+        return None
+
+    def _set_cached_with_ttl(self, ckey, value):
+        self._set_cached(ckey, {"fetchedAt": time.time(), "value": value})
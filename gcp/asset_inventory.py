@@ -0,0 +1,128 @@
+"""
+Optional Cloud Asset Inventory backend for GCPClient
+
+Answers list calls from a Cloud Asset Inventory export
+(https://cloud.google.com/asset-inventory/docs/exporting-to-cloud-storage)
+with content type RESOURCE downloaded to local disk, instead of listing
+each product in every project. The export is newline-delimited JSON with
+one asset per line. It is read once and indexed by asset type and
+project. Results are shaped like GCPClient.list results, so resource
+functions work unchanged.
+"""
+
+import json
+import threading
+from collections import defaultdict
+
+# GCPClient.list (product, subproduct, version) for each supported asset type
+ASSET_TYPES = {
+    "compute.googleapis.com/Firewall": ("compute", "firewalls", "v1"),
+    "compute.googleapis.com/Instance": ("compute", "instances", "v1"),
+    "compute.googleapis.com/Network": ("compute", "networks", "v1"),
+    "iam.googleapis.com/ServiceAccount": ("iam", "projects.serviceAccounts", "v1"),
+    "sqladmin.googleapis.com/Instance": ("sqladmin", "instances", "v1beta4"),
+}
+
+
+def asset_project_id(asset_name):
+    """Returns the project id in a full asset name or None.
+
+    >>> asset_project_id("//compute.googleapis.com/projects/test-project/global/networks/default")
+    'test-project'
+    >>> asset_project_id("//storage.googleapis.com/test-bucket") is None
+    True
+    """
+    parts = asset_name.split("/")
+    if "projects" not in parts[:-1]:
+        return None
+    return parts[parts.index("projects") + 1]
+
+
+def index_assets(lines):
+    """
+    Returns the resource data of the supported assets in NDJSON lines by
+    (product, subproduct, version) and project id. Keys in the export can be
+    snake_case (Cloud Storage exports) or camelCase (API responses).
+
+    >>> index = index_assets([
+    ...     '{"name": "//compute.googleapis.com/projects/p/global/networks/n", "asset_type": "compute.googleapis.com/Network", "resource": {"data": {"name": "n"}}}',
+    ...     '',
+    ...     '{"name": "//storage.googleapis.com/b", "assetType": "storage.googleapis.com/Bucket", "resource": {"data": {"name": "b"}}}',
+    ... ])
+    >>> {key: dict(projects) for key, projects in index.items()}
+    {('compute', 'networks', 'v1'): {'p': [{'name': 'n'}]}}
+    """
+    index = defaultdict(lambda: defaultdict(list))
+    for line in lines:
+        if not line.strip():
+            continue
+        asset = json.loads(line)
+        key = ASSET_TYPES.get(asset.get("asset_type", asset.get("assetType")))
+        if key is None:
+            continue
+        project_id = asset_project_id(asset["name"])
+        index[key][project_id].append(asset["resource"]["data"])
+    return index
+
+
+class AssetInventoryBackend:
+    """
+    Answers supported GCPClient list calls from a Cloud Asset Inventory export
+
+    >>> import os
+    >>> backend = AssetInventoryBackend(
+    ...     os.path.join(os.path.dirname(__file__), "testdata", "asset_inventory_export.json"))
+    >>> backend.project_ids()
+    ['other-project', 'test-project']
+    >>> [firewall["name"] for firewall in backend.list("compute", "firewalls", "v1", ["test-project"])]
+    ['allow-ssh']
+    >>> [(network["projectId"], network["name"]) for network in backend.list(
+    ...     "compute", "networks", "v1", ["test-project", "other-project"])]
+    [('test-project', 'default'), ('other-project', 'default')]
+    >>> [instance["status"] for instance in backend.list("compute", "instances", "v1", ["test-project"])]
+    ['RUNNING']
+    >>> [instance["name"] for instance in backend.list("sqladmin", "instances", "v1beta4", ["test-project"])]
+    ['db']
+    >>> [sa["email"] for sa in backend.list(
+    ...     "iam", "projects.serviceAccounts", "v1", ["test-project"])]
+    ['deploy@test-project.iam.gserviceaccount.com']
+    >>> backend.handles("compute", "firewalls", "v1")
+    True
+    >>> backend.handles("bigquery", "datasets", "v2")
+    False
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def handles(self, product, subproduct, version):
+        return (product, subproduct, version) in ASSET_TYPES.values()
+
+    def project_ids(self):
+        """Returns the sorted ids of projects with supported assets in the export"""
+        return sorted(
+            {
+                project_id
+                for projects in self._load().values()
+                for project_id in projects
+                if project_id is not None
+            }
+        )
+
+    def list(self, product, subproduct, version, project_ids):
+        """Returns the resources of the projects in order like GCPClient.list"""
+        projects = self._load().get((product, subproduct, version), {})
+        return [
+            {"projectId": project_id, **resource}
+            for project_id in project_ids
+            for resource in projects.get(project_id, [])
+        ]
+
+    def _load(self):
+        with self._lock:
+            if self._index is None:
+                with open(self.path) as f:
+                    self._index = index_assets(f)
+            return self._index
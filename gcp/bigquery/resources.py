@@ -1,5 +1,8 @@
 from conftest import gcp_client
 
+# partial response fields of the datasets used by tests and test metadata
+DATASET_FIELDS = "access,datasetReference,friendlyName,id,kind"
+
 
 def datasets():
     results = []
@@ -11,10 +14,15 @@ def datasets():
             results_key="datasets",
             call_kwargs={"projectId": project_id},
         )
-        results += [
-            get_dataset(d["datasetReference"]["datasetId"], project_id)
-            for d in datasets
-        ]
+        results += gcp_client.get_many(
+            project_id,
+            "bigquery",
+            "datasets",
+            "datasetId",
+            [d["datasetReference"]["datasetId"] for d in datasets],
+            version="v2",
+            fields=DATASET_FIELDS,
+        )
     return results
 
 
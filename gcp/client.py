@@ -1,9 +1,21 @@
+import os
+import threading
 import warnings
 import logging
 
-from apiclient.discovery import build as build_service
+from apiclient.discovery import build as build_service, build_from_document
 from apiclient.errors import HttpError
 
+from gcp.api_client import (
+    DEFAULT_MAX_QPS,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_MAX_WORKERS,
+    GoogleAPIClient,
+    call_cache_key,
+    list_fields,
+)
+from gcp.asset_inventory import asset_project_id
+
 
 # Filters out the warning about using end user credentials.
 warnings.filterwarnings(
@@ -16,66 +28,154 @@ logging.getLogger("googleapiclient.discovery_cache").setLevel(logging.ERROR)
 # Filters out a warning about not have a default GCP Project ID. Not required for Frost, no need to display.
 logging.getLogger("google.auth._default").setLevel(logging.ERROR)
 
+# seconds to reuse the cached projects of a --gcp-folder-id
+DEFAULT_FOLDER_CACHE_TTL = 3600
+
+# seconds to reuse cached GKE server configs
+DEFAULT_SERVER_CONFIG_CACHE_TTL = 3600
+
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# zonal or regional resources listed across all zones and regions with aggregatedList
+AGGREGATED_LIST_SUBPRODUCTS = {
+    ("compute", "addresses"),
+    ("compute", "disks"),
+    ("compute", "instances"),
+}
+
 
-def cache_key(project_id, version, product, subproduct, call="list", id_value="na"):
+def cache_key(
+    project_id, version, product, subproduct, call="list", id_value="na", fields=None
+):
     """Returns the fullname (directory and filename) for a cached GCP API call.
 
     >>> cache_key("123", "v1", "compute", "firewalls")
     'pytest_gcp/123/v1/compute/firewalls/list:na.json'
     >>> cache_key("123", "v1", "compute", "firewalls", "get", "321")
     'pytest_gcp/123/v1/compute/firewalls/get:321.json'
+
+    Partial responses are cached separately by a hash of their fields:
+
+    >>> cache_key("123", "v1", "compute", "firewalls", fields="id,name")
+    'pytest_gcp/123/v1/compute/firewalls/list:na:fields-bab7fcd2.json'
     """
-    path = "/".join(["pytest_gcp", project_id, version, product, subproduct])
-    filename = ":".join([call, id_value]) + ".json"
-    return f"{path}/{filename}"
+    return call_cache_key(
+        ["pytest_gcp", project_id, version, product, subproduct], call, id_value, fields
+    )
 
 
-def get_all_projects_in_folder(folder_id=None):
-    if folder_id is None:
-        return
+def list_call_project_id(call_kwargs):
+    """Returns the project id a list call is for or "-".
 
-    if not folder_id.startswith("folders/"):
-        folder_id = "folders/" + folder_id
+    >>> list_call_project_id({"project": "123"})
+    '123'
+    >>> list_call_project_id({"name": "projects/123/serviceAccounts/sa"})
+    '-'
+    """
+    project_id = "-"
+    if "project" in call_kwargs:
+        project_id = call_kwargs["project"]
+    if "projectId" in call_kwargs:
+        project_id = call_kwargs["projectId"]
+    return project_id
 
-    crm = build_service("cloudresourcemanager", "v2")
-    allFolders = get_all_folders_in_folder(crm, folder_id)
-    crm.close()
-    allFolders.append(folder_id)
 
-    project_crm = build_service("cloudresourcemanager", "v1")
-    allProjects = []
-    for folder in allFolders:
-        projects = (
-            project_crm.projects().list(filter="parent.id:" + folder[8:]).execute()
-        )
-        if projects:
-            allProjects.append(projects)
-    project_crm.close()
+def list_cache_key(version, product, subproduct, call_kwargs, fields=None):
+    """Returns the cache key for a list call.
+
+    >>> list_cache_key("v1", "compute", "firewalls", {"project": "123"})
+    'pytest_gcp/project-123/v1/compute/firewalls/list:na.json'
+    """
+    call_id = "-".join(sum([x for x in call_kwargs.items()], ()))
+    return cache_key(call_id, version, product, subproduct, fields=fields)
+
+
+def is_api_disabled_error(error):
+    """Returns whether an HttpError was thrown because an API is disabled in a project."""
+    if error.resp is None:
+        return False
+    reason = error._get_reason()
+    return "has not been used in project" in reason or "has not enabled" in reason
+
+
+def flatten_aggregated_items(scoped_lists, items_key):
+    """Returns the resources from an aggregatedList response's items
+    keyed by zone or region. Scopes without resources only have a warning.
+
+    >>> flatten_aggregated_items({
+    ...     "zones/us-east1-b": {"instances": [{"name": "a"}, {"name": "b"}]},
+    ...     "zones/us-west1-a": {"warning": {"code": "NO_RESULTS_ON_PAGE"}},
+    ...     "zones/us-west1-b": {"instances": [{"name": "c"}]},
+    ... }, "instances")
+    [{'name': 'a'}, {'name': 'b'}, {'name': 'c'}]
+    """
+    items = []
+    for scoped_list in scoped_lists.values():
+        items.extend(scoped_list.get(items_key, []))
+    return items
+
+
+def folder_name(folder_id):
+    """
+    >>> folder_name("123")
+    'folders/123'
+    >>> folder_name("folders/123")
+    'folders/123'
+    """
+    if not folder_id.startswith("folders/"):
+        folder_id = "folders/" + folder_id
+    return folder_id
 
-    # flatten and return
-    return sum([p["projects"] for p in allProjects], [])
 
+def folder_projects_filter(folder_id):
+    """Returns the projects.list filter for projects directly in a folder.
 
-def get_all_folders_in_folder(crm, folder_id=None):
-    allFolders = []
-    if folder_id is None:
-        return allFolders
-    folders = crm.folders().list(parent=folder_id).execute()
-    if folders:
-        for folder in folders["folders"]:
-            allFolders.extend(get_all_folders_in_folder(crm, folder["name"]))
-    else:
-        allFolders = [folder_id]
+    >>> folder_projects_filter("folders/123")
+    'parent.type:folder parent.id:123'
+    """
+    return "parent.type:folder parent.id:" + folder_id.split("/")[-1]
 
-    return allFolders
 
+class GCPClient(GoogleAPIClient):
+    scopes = SCOPES
 
-class GCPClient:
-    def __init__(self, project_id, folder_id, cache, debug_calls, debug_cache, offline):
-        self.cache = cache
-        self.debug_calls = debug_calls
-        self.debug_cache = debug_cache
+    def __init__(
+        self,
+        project_id,
+        folder_id,
+        cache,
+        debug_calls,
+        debug_cache,
+        offline,
+        discovery_dir=None,
+        max_workers=DEFAULT_MAX_WORKERS,
+        folder_cache_ttl=DEFAULT_FOLDER_CACHE_TTL,
+        server_config_cache_ttl=DEFAULT_SERVER_CONFIG_CACHE_TTL,
+        asset_inventory=None,
+        max_qps=DEFAULT_MAX_QPS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        http_pool_size=None,
+    ):
+        super().__init__(
+            cache=cache,
+            debug_calls=debug_calls,
+            debug_cache=debug_cache,
+            max_workers=max_workers,
+            max_qps=max_qps,
+            max_retries=max_retries,
+            http_pool_size=http_pool_size,
+        )
         self.offline = offline
+        self.discovery_dir = discovery_dir
+        self.folder_cache_ttl = folder_cache_ttl
+        self.server_config_cache_ttl = server_config_cache_ttl
+        # an optional gcp.asset_inventory.AssetInventoryBackend
+        self.asset_inventory = asset_inventory
+
+        self._services = {}
+        self._services_lock = threading.Lock()
+        # locks by (product, version) so services build concurrently
+        self._service_locks = {}
 
         self.project_list = []
         if project_id is not None:
@@ -83,53 +183,155 @@ class GCPClient:
 
         if folder_id is not None:
             self.project_list = [
-                p["projectId"] for p in get_all_projects_in_folder(folder_id)
+                p["projectId"] for p in self.get_all_projects_in_folder(folder_id)
+            ]
+
+        if not self.project_list and asset_inventory is not None:
+            self.project_list = asset_inventory.project_ids()
+
+    def get_all_projects_in_folder(self, folder_id):
+        """
+        Returns the projects in a folder and all of its subfolders. Results are cached
+        for folder_cache_ttl seconds.
+        """
+        if self.offline:
+            return []
+
+        folder_id = folder_name(folder_id)
+        ckey = "pytest_gcp/{}/projects.json".format(folder_id)
+        cached_result = self._get_cached_with_ttl(ckey, self.folder_cache_ttl)
+        if cached_result is not None:
+            return cached_result
+
+        projects = []
+        for level in self._walk_folders(folder_id):
+            # one batch of projects.list requests per level of the folder tree
+            for folder_projects in self._list_batched(
+                "cloudresourcemanager",
+                "projects",
+                [{"filter": folder_projects_filter(folder)} for folder in level],
+                results_key="projects",
+            ):
+                projects.extend(folder_projects or [])
+
+        self._set_cached_with_ttl(ckey, projects)
+        return projects
+
+    def _walk_folders(self, folder_id):
+        """
+        Internal helper yielding the folder names at each level of the folder tree
+        under folder_id, breadth first and starting with [folder_id].
+        """
+        level = [folder_id]
+        while level:
+            yield level
+            level = [
+                subfolder["name"]
+                for subfolders in self._list_batched(
+                    "cloudresourcemanager",
+                    "folders",
+                    [{"parent": folder} for folder in level],
+                    version="v2",
+                    results_key="folders",
+                )
+                for subfolder in subfolders or []
             ]
 
     def get_project_iam_policies(self):
+        """
+        Returns the IAM policy of each project with its projectId. Policies are
+        fetched concurrently and cached.
+        """
         if self.offline:
             return []
 
+        return [
+            policy
+            for policy in self._map(self._get_project_iam_policy, self.project_list)
+            if policy is not None
+        ]
+
+    def _get_project_iam_policy(self, project_id):
+        ckey = cache_key(
+            project_id,
+            "v1",
+            "cloudresourcemanager",
+            "projects",
+            "getIamPolicy",
+            project_id,
+        )
+        cached_result = self._get_cached(ckey)
+        if cached_result is not None:
+            return cached_result
+
         service = self._service("cloudresourcemanager")
-        policies = []
-        for project_id in self.project_list:
-            try:
-                resp = (
-                    service.projects()
-                    .getIamPolicy(resource=project_id, body={})
-                    .execute()
-                )
-                policies.append(resp)
-            except HttpError as e:
-                if "has not been used in project" in e._get_reason():
-                    continue
-                raise e
-        return policies
+        try:
+            result = self._execute(
+                service.projects().getIamPolicy(resource=project_id, body={})
+            )
+        except HttpError as e:
+            # This will be thrown if an API is disabled.
+            if "has not been used in project" in e._get_reason():
+                return None
+            raise e
+
+        result["projectId"] = project_id
+        self._set_cached(ckey, result)
+        return result
 
-    def get_project_container_config(self):
+    def get_container_server_configs(self, project_locations):
+        """
+        Returns GKE server configs by (project id, location) for each distinct
+        (project id, location) in project_locations. Configs are fetched
+        concurrently and cached for server_config_cache_ttl seconds.
+        """
         if self.offline:
             return {}
 
-        service = self._service("container")
-        for project_id in self.project_list:
-            try:
-                # TODO : We may want to correlate the zone here with the corresponding clusters zone.
-                request = (
-                    service.projects()
-                    .locations()
-                    .getServerConfig(
-                        name="projects/{}/locations/us-west1".format(project_id)
-                    )
-                )
-                resp = request.execute()
-            except HttpError as e:
-                # This will be thrown if an API is disabled, so we will try the next project id
-                if "has not been used in project" in e._get_reason():
-                    continue
-                raise e
-            return resp
+        project_locations = sorted(set(project_locations))
+        return dict(
+            zip(
+                project_locations,
+                self._map(
+                    lambda project_location: self._get_container_server_config(
+                        *project_location
+                    ),
+                    project_locations,
+                ),
+            )
+        )
 
-        return {}
+    def _get_container_server_config(self, project_id, location):
+        ckey = cache_key(
+            project_id,
+            "v1",
+            "container",
+            "projects.locations",
+            "getServerConfig",
+            location,
+        )
+        cached_result = self._get_cached_with_ttl(ckey, self.server_config_cache_ttl)
+        if cached_result is not None:
+            return cached_result
+
+        request = (
+            self._service("container")
+            .projects()
+            .locations()
+            .getServerConfig(
+                name="projects/{}/locations/{}".format(project_id, location)
+            )
+        )
+        try:
+            result = self._execute(request)
+        except HttpError as e:
+            # This will be thrown if an API is disabled.
+            if is_api_disabled_error(e):
+                return {}
+            raise e
+
+        self._set_cached_with_ttl(ckey, result)
+        return result
 
     def get(
         self,
@@ -140,12 +342,24 @@ class GCPClient:
         id_value,
         version="v1",
         call_kwargs=None,
+        fields=None,
     ):
+        """
+        Public get func. fields is an optional partial response fields parameter
+        selecting the fields of the resource to return.
+        """
         if self.offline:
             result = {}
         else:
             result = self._get(
-                project_id, product, subproduct, id_key, id_value, version
+                project_id,
+                product,
+                subproduct,
+                id_key,
+                id_value,
+                version,
+                call_kwargs,
+                fields,
             )
         return result
 
@@ -158,26 +372,26 @@ class GCPClient:
         id_value,
         version="v1",
         call_kwargs=None,
+        fields=None,
     ):
-        ckey = cache_key(project_id, version, product, subproduct, "get", id_value)
-        cached_result = self.cache.get(ckey, None)
+        ckey = cache_key(
+            project_id, version, product, subproduct, "get", id_value, fields
+        )
+        cached_result = self._get_cached(ckey)
         if cached_result is not None:
-            print("found cached value for", ckey)
             return cached_result
 
         if call_kwargs is None:
             call_kwargs = {}
         call_kwargs["projectId"] = project_id
         call_kwargs[id_key] = id_value
+        if fields is not None:
+            call_kwargs["fields"] = fields
 
-        service = self._service(product, version)
-
-        api_entity = getattr(service, subproduct.split(".")[0])()
-        for entity in subproduct.split(".")[1:]:
-            api_entity = getattr(api_entity, entity)()
+        api_entity = self._api_entity(product, subproduct, version)
 
         try:
-            result = api_entity.get(**call_kwargs).execute()
+            result = self._execute(api_entity.get(**call_kwargs))
         except HttpError as e:
             # This will be thrown if an API is disabled.
             if "has not been used in project" in e._get_reason():
@@ -185,144 +399,360 @@ class GCPClient:
             raise e
 
         result["projectId"] = project_id
+        self._set_cached(ckey, result)
+        return result
+
+    def get_many(
+        self,
+        project_id,
+        product,
+        subproduct,
+        id_key,
+        id_values,
+        version="v1",
+        fields=None,
+    ):
+        """
+        Returns the get results for each of id_values in order. Values that
+        are not cached are fetched with batch requests.
+        """
+        if self.offline:
+            return [{} for _ in id_values]
+
+        ckeys = [
+            cache_key(project_id, version, product, subproduct, "get", id_value, fields)
+            for id_value in id_values
+        ]
+        results = [self._get_cached(ckey) for ckey in ckeys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses:
+            return results
+
+        call_kwargs = {"projectId": project_id}
+        if fields is not None:
+            call_kwargs["fields"] = fields
+        api_entity = self._api_entity(product, subproduct, version)
+        requests = [
+            api_entity.get(**call_kwargs, **{id_key: id_values[i]}) for i in misses
+        ]
+        if self.debug_calls and requests:
+            print(
+                "calling {}.{} get for {} items in project {}".format(
+                    product, subproduct, len(requests), project_id
+                )
+            )
 
-        if self.debug_cache:
-            print("setting cache value for", ckey)
+        for i, (result, error) in zip(
+            misses, self._execute_batches(self._service(product, version), requests)
+        ):
+            if error is not None:
+                if isinstance(error, HttpError) and is_api_disabled_error(error):
+                    results[i] = {}
+                    continue
+                raise error
 
-        self.cache.set(ckey, result)
+            result["projectId"] = project_id
+            self._set_cached(ckeys[i], result)
+            results[i] = result
 
-        return result
+        return results
 
     def list(
-        self, product, subproduct, version="v1", results_key="items", call_kwargs=None
+        self,
+        product,
+        subproduct,
+        version="v1",
+        results_key="items",
+        call_kwargs=None,
+        fields=None,
     ):
         """Public list func. See _list func docstring for more info"""
         if self.offline:
             results = []
+        elif self.asset_inventory is not None and self.asset_inventory.handles(
+            product, subproduct, version
+        ):
+            project_ids = self.project_list
+            if call_kwargs is not None:
+                project_ids = [list_call_project_id(call_kwargs)]
+                if "name" in call_kwargs:
+                    project_ids = [asset_project_id(call_kwargs["name"])]
+            results = self.asset_inventory.list(
+                product, subproduct, version, project_ids
+            )
         else:
             if call_kwargs is not None:
                 return list(
-                    self._list(product, subproduct, version, results_key, call_kwargs)
+                    self._list(
+                        product, subproduct, version, results_key, call_kwargs, fields
+                    )
                 )
 
             results = []
-            for project_id in self.project_list:
-                call_kwargs = {"project": project_id}
-                results += list(
-                    self._list(product, subproduct, version, results_key, call_kwargs)
+            for project_results in self._map(
+                lambda project_id: self._list(
+                    product,
+                    subproduct,
+                    version,
+                    results_key,
+                    {"project": project_id},
+                    fields,
+                ),
+                self.project_list,
+            ):
+                results.extend(project_results)
+
+        return results
+
+    def list_many(
+        self,
+        product,
+        subproduct,
+        call_kwargs_list,
+        version="v1",
+        results_key="items",
+        fields=None,
+    ):
+        """
+        Returns the list results for each of call_kwargs_list in order. Calls
+        that are not cached are fetched with batch requests, then any further
+        pages are fetched one at a time.
+        """
+        if self.offline:
+            return [[] for _ in call_kwargs_list]
+
+        ckeys = [
+            list_cache_key(version, product, subproduct, call_kwargs, fields)
+            for call_kwargs in call_kwargs_list
+        ]
+        results = [self._get_cached(ckey) for ckey in ckeys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses:
+            return results
+
+        fields_kwargs = {}
+        if fields is not None:
+            fields_kwargs["fields"] = list_fields(results_key, fields)
+        for i, items in zip(
+            misses,
+            self._list_batched(
+                product,
+                subproduct,
+                [{**call_kwargs_list[i], **fields_kwargs} for i in misses],
+                version,
+                results_key,
+            ),
+        ):
+            if items is None:
+                # the API is disabled
+                results[i] = []
+                continue
+
+            project_id = list_call_project_id(call_kwargs_list[i])
+            results[i] = [{"projectId": project_id, **item} for item in items]
+            self._set_cached(ckeys[i], results[i])
+
+        return results
+
+    def _list_batched(
+        self, product, subproduct, call_kwargs_list, version="v1", results_key="items"
+    ):
+        """
+        Internal helper returning all items for each of call_kwargs_list in order, or
+        None when the API is disabled. The first pages are fetched with batch requests,
+        any further pages one at a time.
+        """
+        api_entity = self._api_entity(product, subproduct, version)
+        requests = [api_entity.list(**call_kwargs) for call_kwargs in call_kwargs_list]
+        if self.debug_calls and requests:
+            print(
+                "calling {}.{} list for {} items".format(
+                    product, subproduct, len(requests)
                 )
+            )
+
+        results = []
+        for request, (resp, error) in zip(
+            requests, self._execute_batches(self._service(product, version), requests)
+        ):
+            if error is not None:
+                if isinstance(error, HttpError) and is_api_disabled_error(error):
+                    results.append(None)
+                    continue
+                raise error
+
+            items = list(resp.get(results_key, []))
+            next_request = getattr(api_entity, "list_next", lambda *args: None)(
+                request, resp
+            )
+            if next_request is not None:
+                items.extend(self._paginate(api_entity, next_request, results_key))
+            results.append(items)
 
         return results
 
     def _list(
-        self, product, subproduct, version="v1", results_key="items", call_kwargs=None
+        self,
+        product,
+        subproduct,
+        version="v1",
+        results_key="items",
+        call_kwargs=None,
+        fields=None,
     ):
         """
         Internal function for calling .list() on some service's resource. Supports debug printing
         and caching of the response.
 
-        If a service supports "zones", then loop through each zone to collect all resources from
-        that service. An example of this is collecting all compute instances (compute.instances().list()).
-        """
+        If a service lists resources by zone or region, then call .aggregatedList() to collect
+        all of its resources in one paginated call. An example of this is collecting all compute
+        instances (compute.instances().aggregatedList()).
 
-        project_id = "-"
-        if "project" in call_kwargs:
-            project_id = call_kwargs["project"]
-        if "projectId" in call_kwargs:
-            project_id = call_kwargs["projectId"]
+        fields optionally selects the fields of each resource to return with a partial
+        response e.g. "id,name,networkInterfaces/network".
+        """
 
-        call_id = project_id
-        if call_kwargs is not None:
-            call_id = "-".join(sum([x for x in call_kwargs.items()], ()))
+        project_id = list_call_project_id(call_kwargs)
 
-        ckey = cache_key(call_id, version, product, subproduct)
-        cached_result = self.cache.get(ckey, None)
+        ckey = list_cache_key(version, product, subproduct, call_kwargs, fields)
+        cached_result = self._get_cached(ckey)
         if cached_result is not None:
-            print("found cached value for", ckey)
             return cached_result
 
-        service = self._service(product, version)
-
-        api_entity = getattr(service, subproduct.split(".")[0])()
-        for entity in subproduct.split(".")[1:]:
-            api_entity = getattr(api_entity, entity)()
+        api_entity = self._api_entity(product, subproduct, version)
 
         if self.debug_calls:
             print(
                 "calling {}.{} for project {}".format(product, subproduct, project_id)
             )
 
-        if self._zone_aware(product, subproduct):
-            results = []
-            for zone in self._list_zones(project_id):
-                results = sum(
-                    [results],
-                    self._list_all_items(
-                        api_entity, {**call_kwargs, "zone": zone}, results_key
-                    ),
-                )
+        if self._aggregated(product, subproduct):
+            items_key = subproduct.split(".")[-1]
+            if fields is not None:
+                call_kwargs = {
+                    **call_kwargs,
+                    "fields": list_fields(results_key, fields, items_key),
+                }
+            results = self._list_all_items(
+                api_entity,
+                call_kwargs,
+                results_key,
+                method="aggregatedList",
+                items_key=items_key,
+            )
         else:
+            if fields is not None:
+                call_kwargs = {
+                    **call_kwargs,
+                    "fields": list_fields(results_key, fields),
+                }
             results = self._list_all_items(api_entity, call_kwargs, results_key)
 
         # Append the project id to each resource for use in test metadata
         results = [{"projectId": project_id, **result} for result in results]
+        self._set_cached(ckey, results)
 
-        if self.debug_cache:
-            print("setting cache value for", ckey)
+        return results
 
-        self.cache.set(ckey, results)
+    def _list_all_items(
+        self, api_entity, call_kwargs, results_key, method="list", items_key=None
+    ):
+        """
+        Internal helper for dealing with pagination
 
-        return results
+        For aggregated list methods items_key is the key of the resources in each
+        zone or region of results_key.
+        """
+        request = getattr(api_entity, method)(**call_kwargs)
+        return self._paginate(api_entity, request, results_key, method, items_key)
 
-    def _list_all_items(self, api_entity, call_kwargs, results_key):
-        """Internal helper for dealing with pagination"""
-        request = api_entity.list(**call_kwargs)
+    def _paginate(
+        self, api_entity, request, results_key, method="list", items_key=None
+    ):
+        """Internal helper returning the items of request and its following pages"""
         items = []
         while request is not None:
             try:
-                resp = request.execute()
+                resp = self._execute(request)
             except HttpError as e:
                 # This will be thrown if an API is disabled.
-                if "has not been used in project" in e._get_reason():
-                    return []
-                if "has not enabled" in e._get_reason():
+                if is_api_disabled_error(e):
                     return []
                 raise e
-            items = sum([items], resp.get(results_key, []))
+            if items_key is None:
+                items.extend(resp.get(results_key, []))
+            else:
+                items.extend(
+                    flatten_aggregated_items(resp.get(results_key, {}), items_key)
+                )
             try:
-                request = api_entity.list_next(request, resp)
+                request = getattr(api_entity, method + "_next")(request, resp)
             except AttributeError:
                 request = None
 
         return items
 
     def _service(self, product, version="v1"):
-        """Internal helper around google client lib's build service func"""
+        """
+        Internal helper around google client lib's build service func. Builds each
+        (product, version) service once per client. Threads using a service that is
+        being built wait for it, while other services build concurrently.
+
+        >>> client = GCPClient(None, None, None, False, False, True)
+        >>> client._build_service = lambda product, version: object()
+        >>> client._service("compute") is client._service("compute", "v1")
+        True
+        >>> client._service("compute") is client._service("compute", "beta")
+        False
+        """
+        key = (product, version)
+        with self._services_lock:
+            lock = self._service_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            if key not in self._services:
+                self._services[key] = self._build_service(product, version)
+            return self._services[key]
+
+    def _build_service(self, product, version):
+        """
+        Internal helper for building a service from a static discovery document
+        named <product>.<version>.json in discovery_dir, or fetching the document
+        when there is no such file.
+        """
+        self._count("service builds: {}.{}".format(product, version))
+
+        if self.discovery_dir is not None:
+            path = os.path.join(
+                self.discovery_dir, "{}.{}.json".format(product, version)
+            )
+            if os.path.exists(path):
+                with open(path) as f:
+                    return build_from_document(f.read())
+
         return build_service(product, version)
 
-    def _zone_aware(self, product, subproduct):
+    def _api_entity(self, product, subproduct, version="v1"):
+        """Internal helper returning the resource for a dotted subproduct e.g. projects.serviceAccounts"""
+        api_entity = getattr(
+            self._service(product, version), subproduct.split(".")[0]
+        )()
+        for entity in subproduct.split(".")[1:]:
+            api_entity = getattr(api_entity, entity)()
+        return api_entity
+
+    def _aggregated(self, product, subproduct):
         """
-        Internal helper for whether or not a product and subproduct take zones into account.
+        Internal helper for whether or not a product and subproduct are listed by zone or region
+        and support aggregated listing across them.
 
         Differing heavily from AWS, most GCP services do not take zones into account with API
         calls.
-        """
-        if product == "compute" and subproduct == "instances":
-            return True
-        return False
 
-    def _list_zones(self, project_id):
-        """Internal helper for listing all zones"""
-        try:
-            response = (
-                self._service("compute")
-                .zones()
-                .list(project=project_id)
-                .execute()["items"]
-            )
-        except HttpError as e:
-            # This will be thrown if an API is disabled.
-            if "has not been used in project" in e._get_reason():
-                return []
-            raise e
-        return [result["name"] for result in response]
+        >>> client = GCPClient(None, None, None, False, False, True)
+        >>> client._aggregated("compute", "instances")
+        True
+        >>> client._aggregated("compute", "firewalls")
+        False
+        """
+        return (product, subproduct) in AGGREGATED_LIST_SUBPRODUCTS
@@ -0,0 +1,73 @@
+"""
+Times the in-use firewall join on a synthetic organization
+
+Run with: python -m gcp.compute.benchmark [instances] [firewalls] [networks]
+"""
+
+import sys
+import timeit
+
+from gcp.compute.helpers import in_use_firewalls
+
+
+def network_self_link(i):
+    return "https://www.googleapis.com/compute/v1/projects/p{0}/global/networks/n{0}".format(
+        i
+    )
+
+
+def synthetic_org(instance_count, firewall_count, network_count):
+    """
+    Returns networks, instances with two interfaces and firewalls spread over
+    network_count networks, of which every other one has instances.
+
+    >>> networks, instances, firewalls = synthetic_org(4, 6, 4)
+    >>> len(networks), len(instances), len(firewalls)
+    (4, 4, 6)
+    >>> from gcp.compute.helpers import instances_by_network
+    >>> len(instances_by_network(instances))
+    2
+    """
+    networks = [{"selfLink": network_self_link(i)} for i in range(network_count)]
+    instances = [
+        {
+            "name": "i{}".format(i),
+            "networkInterfaces": [
+                {"network": network_self_link(i * 2 % network_count)},
+                {"network": network_self_link((i * 2 + 2) % network_count)},
+            ],
+        }
+        for i in range(instance_count)
+    ]
+    firewalls = [
+        {
+            "name": "f{}".format(i),
+            "network": network_self_link(i % network_count),
+            "disabled": i % 10 == 0,
+        }
+        for i in range(firewall_count)
+    ]
+    return networks, instances, firewalls
+
+
+def main(instance_count=50000, firewall_count=10000, network_count=2000):
+    networks, instances, firewalls = synthetic_org(
+        instance_count, firewall_count, network_count
+    )
+    runs = 5
+    seconds = timeit.timeit(
+        lambda: in_use_firewalls(firewalls, networks, instances), number=runs
+    )
+    print(
+        "{} in use of {} firewalls, {} instances, {} networks: {:.3f}s per run".format(
+            len(in_use_firewalls(firewalls, networks, instances)),
+            firewall_count,
+            instance_count,
+            network_count,
+            seconds / runs,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -122,3 +122,83 @@ def firewall_id(firewall):
         if hasattr(firewall, "__getitem__")
         else None
     )
+
+
+def instances_by_network(instances):
+    """
+    Returns the instances with an interface on each network by network selfLink.
+    Instances with several interfaces on a network are listed once.
+
+    >>> index = instances_by_network([
+    ...     {'name': 'a', 'networkInterfaces': [{'network': 'n1'}, {'network': 'n1'}, {'network': 'n2'}]},
+    ...     {'name': 'b', 'networkInterfaces': [{'network': 'n1'}]},
+    ... ])
+    >>> sorted((network, [i['name'] for i in instances]) for network, instances in index.items())
+    [('n1', ['a', 'b']), ('n2', ['a'])]
+    """
+    index = {}
+    for instance in instances:
+        for network in {
+            interface["network"] for interface in instance["networkInterfaces"]
+        }:
+            index.setdefault(network, []).append(instance)
+    return index
+
+
+def firewalls_on_networks(firewalls, network_self_links):
+    """
+    Returns the enabled firewalls for one of network_self_links.
+
+    >>> firewalls_on_networks([
+    ...     {'name': 'a', 'network': 'n1', 'disabled': False},
+    ...     {'name': 'b', 'network': 'n1', 'disabled': True},
+    ...     {'name': 'c', 'network': 'n2', 'disabled': False},
+    ... ], {'n1'})
+    [{'name': 'a', 'network': 'n1', 'disabled': False}]
+    """
+    return [
+        firewall
+        for firewall in firewalls
+        if not firewall["disabled"] and firewall["network"] in network_self_links
+    ]
+
+
+def networks_with_instances(networks, instances):
+    """
+    Returns the networks with at least one instance, adding their instances under
+    "instances" to each of networks.
+
+    >>> [network["selfLink"] for network in networks_with_instances(
+    ...     [{'selfLink': 'n1'}, {'selfLink': 'n2'}],
+    ...     [{'name': 'a', 'networkInterfaces': [{'network': 'n1'}]}],
+    ... )]
+    ['n1']
+    """
+    network_instances = instances_by_network(instances)
+    in_use_networks = []
+    for network in networks:
+        network["instances"] = network_instances.get(network["selfLink"], [])
+        if len(network["instances"]):
+            in_use_networks.append(network)
+
+    return in_use_networks
+
+
+def in_use_firewalls(firewalls, networks, instances):
+    """
+    Returns the enabled firewalls on networks with at least one instance.
+
+    >>> in_use_firewalls(
+    ...     [{'name': 'a', 'network': 'n1', 'disabled': False}, {'name': 'c', 'network': 'n2', 'disabled': False}],
+    ...     [{'selfLink': 'n1'}, {'selfLink': 'n2'}],
+    ...     [{'name': 'a', 'networkInterfaces': [{'network': 'n1'}]}],
+    ... )
+    [{'name': 'a', 'network': 'n1', 'disabled': False}]
+    """
+    return firewalls_on_networks(
+        firewalls,
+        {
+            network["selfLink"]
+            for network in networks_with_instances(networks, instances)
+        },
+    )
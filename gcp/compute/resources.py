@@ -1,56 +1,49 @@
 from conftest import gcp_client
+from gcp.compute import helpers
+
+# partial response fields of the resources used by tests and test metadata
+FIREWALL_FIELDS = "allowed,disabled,id,kind,name,network,selfLink,sourceRanges"
+NETWORK_FIELDS = "id,kind,name,selfLink"
+INSTANCE_FIELDS = "id,kind,name,networkInterfaces/network,selfLink"
 
 
 def firewalls():
-    return gcp_client.list("compute", "firewalls")
+    return gcp_client.list("compute", "firewalls", fields=FIREWALL_FIELDS)
 
 
 def networks():
-    return gcp_client.list("compute", "networks")
+    return gcp_client.list("compute", "networks", fields=NETWORK_FIELDS)
 
 
 def instances():
-    return gcp_client.list("compute", "instances")
+    return gcp_client.list("compute", "instances", fields=INSTANCE_FIELDS)
 
 
 def clusters():
     results = []
     for project_id in gcp_client.project_list:
-        results += gcp_client.list(
-            "container",
-            "projects.locations.clusters",
-            results_key="clusters",
-            call_kwargs={"parent": "projects/{}/locations/-".format(project_id)},
-        )
+        results += [
+            {**cluster, "projectId": project_id}
+            for cluster in gcp_client.list(
+                "container",
+                "projects.locations.clusters",
+                results_key="clusters",
+                call_kwargs={"parent": "projects/{}/locations/-".format(project_id)},
+            )
+        ]
     return results
 
 
-def networks_with_instances():
-    allInstances = instances()
-    in_use_networks = []
-    for network in networks():
-        network["instances"] = []
-        for instance in allInstances:
-            if network["selfLink"] in [
-                interface["network"] for interface in instance["networkInterfaces"]
-            ]:
-                network["instances"].append(instance)
-        if len(network["instances"]):
-            in_use_networks.append(network)
+def cluster_server_configs():
+    """Returns GKE server configs by (project id, location) of the clusters"""
+    return gcp_client.get_container_server_configs(
+        (cluster["projectId"], cluster["location"]) for cluster in clusters()
+    )
+
 
-    return in_use_networks
+def networks_with_instances():
+    return helpers.networks_with_instances(networks(), instances())
 
 
 def in_use_firewalls():
-    all_networks = networks_with_instances()
-    results = []
-    for firewall in firewalls():
-        if firewall["disabled"] == True:
-            continue
-        for network in all_networks:
-            if (
-                network["selfLink"] == firewall["network"]
-                and len(network["instances"]) > 0
-            ):
-                results.append(firewall)
-    return results
+    return helpers.in_use_firewalls(firewalls(), networks(), instances())
@@ -2,25 +2,25 @@ import pytest
 
 from helpers import get_param_id
 
-from gcp.compute.resources import clusters
-from conftest import gcp_client
+from gcp.compute.resources import clusters, cluster_server_configs
 
 
-@pytest.fixture
-def server_config():
-    return gcp_client.get_project_container_config()
+@pytest.fixture(scope="session")
+def server_configs():
+    return cluster_server_configs()
 
 
 @pytest.mark.gcp_compute
 @pytest.mark.parametrize(
     "cluster", clusters(), ids=lambda c: get_param_id(c, "name"),
 )
-def test_gke_version_up_to_date(cluster, server_config):
+def test_gke_version_up_to_date(cluster, server_configs):
     """
     Tests if GKE version is up to date by comparing the
-    list of valid master versions to what is
-    currently running on the cluster.
+    list of valid master versions in the cluster's location
+    to what is currently running on the cluster.
     """
+    server_config = server_configs[(cluster["projectId"], cluster["location"])]
     assert (
         cluster["currentMasterVersion"] in server_config["validMasterVersions"]
     ), "Current GKE master version ({}) is not in the list of valid master versions.".format(
@@ -1,3 +1,5 @@
+import functools
+
 from conftest import gcp_client
 
 
@@ -24,16 +26,24 @@ def service_account_keys(service_account):
 
 def all_service_account_keys():
     keys = []
-    for sa in service_accounts():
-        for key in service_account_keys(sa):
-            keys.append(key)
+    for sa_keys in gcp_client.list_many(
+        "iam",
+        "projects.serviceAccounts.keys",
+        [{"name": sa["name"]} for sa in service_accounts()],
+        results_key="keys",
+    ):
+        keys.extend(sa_keys)
     return keys
 
 
+@functools.lru_cache(maxsize=1)
 def project_iam_bindings():
-    bindings = []
-    policies = gcp_client.get_project_iam_policies()
-    for policy in policies:
-        for binding in policy.get("bindings", []):
-            bindings.append(binding)
-    return bindings
+    """
+    Returns the bindings of every project IAM policy with the projectId of its
+    project. Policies are fetched once per run.
+    """
+    return [
+        {"projectId": policy["projectId"], **binding}
+        for policy in gcp_client.get_project_iam_policies()
+        for binding in policy.get("bindings", [])
+    ]
@@ -0,0 +1,83 @@
+"""
+Pooled keep-alive HTTP transport for Google API clients
+
+The discovery based API clients send requests with httplib2, which opens a
+connection per Http object and is not thread-safe. AuthorizedSessionHttp
+adapts a google-auth AuthorizedSession (a requests Session with a
+connection pool) to the httplib2.Http interface the clients use, so one
+transport can be shared by all threads and reuses connections.
+"""
+
+import httplib2
+import requests
+import requests.adapters
+from google.auth.transport.requests import AuthorizedSession
+
+# seconds to wait to connect and for each read
+TIMEOUT = (10, 120)
+
+
+def httplib2_response(status, reason, headers):
+    """Returns an httplib2.Response for a response status, reason and headers.
+    Content is already decoded, so its encoding is dropped.
+
+    >>> response = httplib2_response(404, "Not Found", {"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    >>> response.status, response.reason, dict(response)
+    (404, 'Not Found', {'content-type': 'application/json', 'status': '404'})
+    """
+    info = {
+        key.lower(): value
+        for key, value in headers.items()
+        if key.lower() != "content-encoding"
+    }
+    info["status"] = str(status)
+    response = httplib2.Response(info)
+    response.reason = reason
+    return response
+
+
+class AuthorizedSessionHttp:
+    """
+    httplib2.Http compatible transport sending requests with a thread-safe
+    AuthorizedSession keeping up to pool_size connections alive per host
+
+    >>> import google.auth.credentials
+    >>> http = AuthorizedSessionHttp(google.auth.credentials.AnonymousCredentials(), pool_size=4)
+    >>> http.session.get_adapter("https://compute.googleapis.com")._pool_maxsize
+    4
+    """
+
+    def __init__(self, credentials, pool_size):
+        # the discovery clients read credentials from the transport to
+        # authorize the requests in batch requests
+        self.credentials = credentials
+        self.session = AuthorizedSession(credentials)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+
+    def request(
+        self,
+        uri,
+        method="GET",
+        body=None,
+        headers=None,
+        redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type=None,
+    ):
+        try:
+            response = self.session.request(
+                method, uri, data=body, headers=headers, timeout=TIMEOUT
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # raise the builtin errors the API clients and retries handle
+            raise ConnectionError(str(e)) from e
+
+        return (
+            httplib2_response(response.status_code, response.reason, response.headers),
+            response.content,
+        )
+
+    def close(self):
+        self.session.close()
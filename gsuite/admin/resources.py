@@ -1,8 +1,14 @@
 from conftest import gsuite_client
 
+# fields of group owners used by owner checks and test metadata
+OWNER_FIELDS = "email,id,kind,role,status,type"
+
+# fields of users used by activity checks and test metadata
+USER_FIELDS = "id,kind,lastLoginTime,name,primaryEmail"
+
 
 def list_users():
-    return gsuite_client.list_users()
+    return gsuite_client.list_users(fields=USER_FIELDS)
 
 
 def list_groups():
@@ -14,7 +20,27 @@ def list_members_of_group(group):
 
 
 def list_groups_and_members():
+    groups = list_groups()
+    return [
+        {**group, "members": members}
+        for group, members in zip(
+            groups,
+            gsuite_client.list_members_of_groups([group["email"] for group in groups]),
+        )
+    ]
+
+
+def list_groups_and_owners():
+    """
+    Returns groups with their owners as members. Only owners are fetched.
+    """
+    groups = list_groups()
     return [
-        {**group, "members": list_members_of_group(group["email"])}
-        for group in list_groups()
+        {**group, "members": owners}
+        for group, owners in zip(
+            groups,
+            gsuite_client.list_members_of_groups(
+                [group["email"] for group in groups], roles="OWNER", fields=OWNER_FIELDS
+            ),
+        )
     ]
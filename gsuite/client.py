@@ -1,19 +1,91 @@
+import json
 import os
 import httplib2
 
 from apiclient import discovery
-import google.auth
+
+from gcp.api_client import (
+    DEFAULT_MAX_QPS,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_MAX_WORKERS,
+    GoogleAPIClient,
+    call_cache_key,
+    list_fields,
+)
 
 SCOPES = [
     "https://www.googleapis.com/auth/admin.directory.user.readonly",
     "https://www.googleapis.com/auth/admin.directory.group.readonly",
 ]
 
+# the largest pages the Directory API returns
+USERS_MAX_RESULTS = 500
+GROUPS_MAX_RESULTS = 200
+MEMBERS_MAX_RESULTS = 200
+
+# seconds to reuse cached users, groups and members
+DEFAULT_CACHE_TTL = 3600
+
+
+def cache_key(domain, resource, id_value="na", fields=None, roles=None):
+    """Returns the fullname (directory and filename) for a cached Directory API list.
+    Member lists filtered by roles are cached separately.
+
+    >>> cache_key("example.com", "users")
+    'pytest_gsuite/example.com/users/list:na.json'
+    >>> cache_key("example.com", "members", "group@example.com", roles="OWNER")
+    'pytest_gsuite/example.com/members/list-OWNER:group@example.com.json'
+    """
+    call = "list" if roles is None else "list-" + roles
+    return call_cache_key(["pytest_gsuite", domain, resource], call, id_value, fields)
+
 
-class GsuiteClient:
-    def __init__(self, domain, offline):
+def members_list_kwargs(group, roles=None, fields=None):
+    """
+    Returns the members().list kwargs for the members of group with one of roles
+    returning fields of each member.
+
+    >>> members_list_kwargs("group@example.com")
+    {'groupKey': 'group@example.com', 'maxResults': 200}
+    >>> members_list_kwargs("group@example.com", "OWNER", "email,role")
+    {'groupKey': 'group@example.com', 'maxResults': 200, 'roles': 'OWNER', 'fields': 'nextPageToken,members(email,role)'}
+    """
+    kwargs = {"groupKey": group, "maxResults": MEMBERS_MAX_RESULTS}
+    if roles is not None:
+        kwargs["roles"] = roles
+    if fields is not None:
+        kwargs["fields"] = list_fields("members", fields)
+    return kwargs
+
+
+class GsuiteClient(GoogleAPIClient):
+    scopes = SCOPES
+
+    def __init__(
+        self,
+        domain,
+        offline,
+        http_pool_size=None,
+        max_workers=DEFAULT_MAX_WORKERS,
+        cache=None,
+        debug_calls=False,
+        debug_cache=False,
+        cache_ttl=DEFAULT_CACHE_TTL,
+        max_qps=DEFAULT_MAX_QPS,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
+        super().__init__(
+            cache=cache,
+            debug_calls=debug_calls,
+            debug_cache=debug_cache,
+            max_workers=max_workers,
+            max_qps=max_qps,
+            max_retries=max_retries,
+            http_pool_size=http_pool_size,
+        )
         self.domain = domain
         self.offline = offline
+        self.cache_ttl = cache_ttl
 
         if not self.offline:
             self.directory_client = self.build_directory_client()
@@ -21,47 +93,185 @@ class GsuiteClient:
     def build_directory_client(self):
         # TODO: Support service accounts:
         #   https://googleapis.github.io/google-api-python-client/docs/oauth-server.html#examples
-        credentials, _ = google.auth.default(scopes=SCOPES)
-        return discovery.build("admin", "directory_v1", credentials=credentials)
+        return discovery.build(
+            "admin", "directory_v1", credentials=self._get_credentials()
+        )
 
-    def list_users(self):
+    def list_users(self, fields=None):
         """
         https://developers.google.com/admin-sdk/directory/v1/reference/users#resource
+
+        fields optionally selects the fields of each user to return.
         """
+        return list(self.iter_users(fields))
+
+    def iter_users(self, fields=None):
+        """Yields the users of list_users as they are read from the cache or API"""
         if self.offline:
-            return []
+            return
 
-        req = self.directory_client.users().list(domain=self.domain)
-        users = []
-        while req is not None:
-            resp = req.execute()
-            users += resp.get("users", [])
-            req = self.directory_client.users().list_next(req, resp)
-        return users
+        kwargs = {"domain": self.domain, "maxResults": USERS_MAX_RESULTS}
+        if fields is not None:
+            kwargs["fields"] = list_fields("users", fields)
+        yield from self._iter_cached(
+            cache_key(self.domain, "users", fields=fields),
+            self.directory_client.users(),
+            kwargs,
+            "users",
+        )
 
     def list_groups(self):
         """
         https://developers.google.com/admin-sdk/directory/v1/reference/groups
         """
+        return list(self.iter_groups())
+
+    def iter_groups(self):
+        """Yields the groups of list_groups as they are read from the cache or API"""
         if self.offline:
-            return []
+            return
 
-        req = self.directory_client.groups().list(domain=self.domain)
-        groups = []
-        while req is not None:
-            resp = req.execute()
-            groups += resp.get("groups", [])
-            req = self.directory_client.groups().list_next(req, resp)
-        return groups
+        yield from self._iter_cached(
+            cache_key(self.domain, "groups"),
+            self.directory_client.groups(),
+            {"domain": self.domain, "maxResults": GROUPS_MAX_RESULTS},
+            "groups",
+        )
 
-    def list_members_of_group(self, group):
+    def list_members_of_group(self, group, roles=None, fields=None):
+        """
+        https://developers.google.com/admin-sdk/directory/v1/reference/members/list
+
+        roles optionally filters members by a comma separated list of roles e.g.
+        "OWNER", and fields selects the fields of each member to return.
+        """
         if self.offline:
             return []
 
-        req = self.directory_client.members().list(groupKey=group)
-        members = []
+        return list(
+            self._iter_cached(
+                self._members_cache_key(group, roles, fields),
+                self.directory_client.members(),
+                members_list_kwargs(group, roles, fields),
+                "members",
+            )
+        )
+
+    def list_members_of_groups(self, groups, roles=None, fields=None):
+        """
+        Returns the members of each of groups in order. See list_members_of_group
+        for roles and fields.
+
+        The first pages of members of groups that are not cached are fetched with
+        batch requests of up to BATCH_SIZE groups, running up to max_workers batches
+        at a time, and any further pages one at a time.
+        """
+        if self.offline:
+            return [[] for _ in groups]
+
+        groups = list(groups)
+        ckeys = [self._members_cache_key(group, roles, fields) for group in groups]
+        results = [self._get_cached_items(ckey) for ckey in ckeys]
+        misses = [i for i, result in enumerate(results) if result is None]
+
+        for i, members in zip(
+            misses,
+            self._list_members_of_batch([groups[i] for i in misses], roles, fields),
+        ):
+            self._set_cached_items(ckeys[i], members)
+            results[i] = members
+
+        return results
+
+    def _members_cache_key(self, group, roles, fields):
+        return cache_key(self.domain, "members", group, fields, roles)
+
+    def _list_members_of_batch(self, groups, roles=None, fields=None):
+        """
+        Internal helper returning the members of each of groups in order. The first
+        pages are fetched with batch requests, any further pages one at a time.
+        """
+        members_resource = self.directory_client.members()
+        requests = [
+            members_resource.list(**members_list_kwargs(group, roles, fields))
+            for group in groups
+        ]
+        if self.debug_calls:
+            print("calling members.list for {} groups".format(len(groups)))
+
+        results = []
+        for request, (resp, error) in zip(
+            requests, self._execute_batches(self.directory_client, requests)
+        ):
+            if error is not None:
+                raise error
+
+            members = resp.get("members", [])
+            next_request = members_resource.list_next(request, resp)
+            if next_request is not None:
+                members += list(
+                    self._iter_pages(members_resource, next_request, "members")
+                )
+            results.append(members)
+        return results
+
+    def _iter_cached(self, ckey, resource, kwargs, results_key):
+        """
+        Internal helper yielding the cached items for ckey or, when they are not
+        cached or older than cache_ttl, the results_key items of all pages of
+        resource.list(**kwargs), caching them once all are read.
+        """
+        cached_result = self._get_cached_items(ckey)
+        if cached_result is not None:
+            yield from cached_result
+            return
+
+        if self.debug_calls:
+            print("calling {}.list for {}".format(results_key, kwargs))
+
+        items = []
+        for item in self._iter_pages(resource, resource.list(**kwargs), results_key):
+            items.append(item)
+            yield item
+
+        self._set_cached_items(ckey, items)
+
+    def _iter_pages(self, resource, req, results_key):
+        """Yields the results_key items of req and its following pages"""
         while req is not None:
-            resp = req.execute()
-            members += resp.get("members", [])
-            req = self.directory_client.members().list_next(req, resp)
-        return members
+            resp = self._execute(req)
+            yield from resp.get(results_key, [])
+            req = resource.list_next(req, resp)
+
+    def _get_cached_items(self, ckey):
+        """
+        Internal helper returning the items cached with _set_cached_items for ckey
+        less than cache_ttl seconds ago or None. The items are stored as a JSON
+        string, so the pytest cache does not read their ISO datetime strings e.g.
+        lastLoginTime as datetimes, and they are returned as the API returned them.
+
+        >>> import json
+        >>> from cache import json_iso_datetime_string_to_datetime
+        >>> class PatchedCache(dict):
+        ...     "Stores values like the patched pytest cache (see cache.py)"
+        ...     def set(self, key, value):
+        ...         self[key] = json.dumps(value)
+        ...     def get(self, key, default):
+        ...         if key not in self:
+        ...             return default
+        ...         return json.loads(self[key], object_hook=json_iso_datetime_string_to_datetime)
+        >>> client = GsuiteClient("example.com", offline=True, cache=PatchedCache())
+        >>> client._set_cached_items("users", [{"lastLoginTime": "2020-01-01T00:00:00.000Z"}])
+        >>> client._get_cached_items("users")
+        [{'lastLoginTime': '2020-01-01T00:00:00.000Z'}]
+        >>> client._get_cached_items("groups") is None
+        True
+        """
+        cached_result = self._get_cached_with_ttl(ckey, self.cache_ttl)
+        if not isinstance(cached_result, str):
+            # not cached, expired or cached before items were stored as JSON
+            return None
+        return json.loads(cached_result)
+
+    def _set_cached_items(self, ckey, items):
+        self._set_cached_with_ttl(ckey, json.dumps(items))
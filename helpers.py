@@ -1,4 +1,6 @@
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
 
 
 def get_param_id(obj: Any, key: str) -> Optional[str]:
@@ -13,3 +15,23 @@ def get_param_id(obj: Any, key: str) -> Optional[str]:
         return obj[key]
     except KeyError:
         return None
+
+
+def chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    Yields successive lists of at most size items
+
+    >>> list(chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    >>> list(chunks([], 20))
+    []
+    """
+    assert size > 0
+    chunk: List[T] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk